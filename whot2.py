@@ -1,551 +1,865 @@
-import pygame
-import random
-import sys
-from pygame.locals import *
-
-# Initialize pygame
-pygame.init()
-
-# Screen dimensions
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('Whot Card Game')
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-PURPLE = (128, 0, 128)
-BG_COLOR = (50, 150, 100)  # Green table
-
-# Font
-font = pygame.font.SysFont('Arial', 24)
-large_font = pygame.font.SysFont('Arial', 32)
-
-# Card dimensions
-CARD_WIDTH = 80
-CARD_HEIGHT = 120
-
-# Define card shapes and their colors
-SHAPES = {
-    'circle': RED,
-    'triangle': BLUE,
-    'cross': GREEN,
-    'square': YELLOW,
-    'star': PURPLE,
-    'whot': BLACK
-}
-
-# Game state
-
-
-class WhotGame:
-    def __init__(self):
-        self.deck = self.create_deck()
-        self.player_hand = []
-        self.computer_hand = []
-        self.play_pile = []
-        self.market_pile = []
-        self.game_status = 'initializing'
-        self.message = 'Welcome to Whot!'
-        self.selected_card = None
-        self.whot_shape_request = None
-        self.initialize_game()
-
-    def create_deck(self):
-        deck = []
-        # Add numbered cards for each shape (except whot)
-        for shape in list(SHAPES.keys())[:-1]:  # All except 'whot'
-            # Add 1-14 cards for each shape
-            for num in range(1, 15):
-                # Skip 6 and 9 to match official Whot deck
-                if num != 6 and num != 9:
-                    deck.append({'shape': shape, 'number': num})
-
-        # Add special Whot cards
-        for _ in range(5):
-            deck.append({'shape': 'whot', 'number': 20})
-
-        return deck
-
-    def initialize_game(self):
-        # Shuffle deck
-        random.shuffle(self.deck)
-
-        # Deal 7 cards to player and computer
-        self.player_hand = self.deck[:7]
-        self.computer_hand = self.deck[7:14]
-
-        # Set market pile
-        self.market_pile = self.deck[14:-1]
-
-        # Set initial card
-        self.play_pile = [self.deck[-1]]
-
-        self.game_status = 'playing'
-        self.message = 'Your turn! Play a card or pick from market.'
-
-    def pick_from_market(self):
-        if not self.market_pile:
-            self.message = 'Market is empty!'
-            return False
-
-        card = self.market_pile[0]
-        self.market_pile = self.market_pile[1:]
-
-        self.player_hand.append(card)
-        self.message = 'You picked from market. Computer\'s turn.'
-        return True  # Player picked a card
-
-    def can_play_card(self, card):
-        top_card = self.play_pile[-1]
-
-        # Whot card can always be played
-        if card['shape'] == 'whot':
-            return True
-
-        # If top card is a Whot and a shape was requested
-        if top_card['shape'] == 'whot' and self.whot_shape_request:
-            return card['shape'] == self.whot_shape_request
-
-        # Regular matching (shape or number)
-        return card['shape'] == top_card['shape'] or card['number'] == top_card['number']
-
-    def play_card(self, card_index):
-        if not (0 <= card_index < len(self.player_hand)):
-            return False
-
-        card = self.player_hand[card_index]
-
-        if not self.can_play_card(card):
-            self.message = 'Invalid move! Card must match shape or number'
-            return False
-
-        # Remove card from player's hand
-        self.player_hand.pop(card_index)
-
-        # Add card to play pile
-        self.play_pile.append(card)
-        self.selected_card = None
-
-        # Check win condition
-        if len(self.player_hand) == 0:
-            self.message = 'You win! 🎉'
-            self.game_status = 'ended'
-            return True
-
-        # Handle special cards
-        if card['shape'] == 'whot':
-            self.game_status = 'whotRequest'
-            self.message = 'You played a Whot card! Select a shape to request:'
-            return True
-
-        if card['number'] == 2:
-            # Pick two
-            self.pick_cards_from_market(2, 'computer')
-            self.message = 'Computer picks 2! Your turn again.'
-            return True
-
-        if card['number'] == 14:
-            # General Market
-            self.pick_cards_from_market(1, 'computer')
-            self.message = 'General Market! Computer picks 1. Your turn again.'
-            return True
-
-        # Computer's turn
-        self.message = 'Computer\'s turn...'
-        return True
-
-    def request_shape(self, shape):
-        self.whot_shape_request = shape
-        self.message = f'You requested {shape}. Computer\'s turn...'
-        self.game_status = 'playing'
-        return True
-
-    def pick_cards_from_market(self, count, player):
-        if len(self.market_pile) < count:
-            count = len(self.market_pile)
-
-        cards = self.market_pile[:count]
-        self.market_pile = self.market_pile[count:]
-
-        if player == 'player':
-            self.player_hand.extend(cards)
-        else:
-            self.computer_hand.extend(cards)
-
-    def computer_play(self):
-        # Find playable cards
-        top_card = self.play_pile[-1]
-        playable_cards = []
-
-        for i, card in enumerate(self.computer_hand):
-            # Whot card can always be played
-            if card['shape'] == 'whot':
-                playable_cards.append(i)
-                continue
-
-            # Check if card matches requested shape from whot
-            if top_card['shape'] == 'whot' and self.whot_shape_request:
-                if card['shape'] == self.whot_shape_request:
-                    playable_cards.append(i)
-                continue
-
-            # Regular matching (shape or number)
-            if card['shape'] == top_card['shape'] or card['number'] == top_card['number']:
-                playable_cards.append(i)
-
-        # If no playable cards, pick from market
-        if not playable_cards:
-            if self.market_pile:
-                card = self.market_pile[0]
-                self.market_pile = self.market_pile[1:]
-                self.computer_hand.append(card)
-                self.message = 'Computer picked from market. Your turn!'
-            else:
-                self.message = 'Market is empty! Your turn!'
-            return
-
-        # Play a random card from playable cards
-        card_index = random.choice(playable_cards)
-        card = self.computer_hand.pop(card_index)
-        self.play_pile.append(card)
-
-        # Check win condition
-        if len(self.computer_hand) == 0:
-            self.message = 'Computer wins! 😢'
-            self.game_status = 'ended'
-            return
-
-        # Handle special cards
-        if card['shape'] == 'whot':
-            # Computer chooses most common shape in its hand
-            shapes = {}
-            for c in self.computer_hand:
-                if c['shape'] != 'whot':
-                    shapes[c['shape']] = shapes.get(c['shape'], 0) + 1
-
-            if shapes:
-                most_common = max(shapes, key=shapes.get)
-                self.whot_shape_request = most_common
-                self.message = f'Computer played a Whot and requests {most_common}. Your turn!'
-            else:
-                # If only whot cards left, choose a random shape
-                self.whot_shape_request = random.choice(
-                    list(SHAPES.keys())[:-1])
-                self.message = f'Computer played a Whot and requests {self.whot_shape_request}. Your turn!'
-            return
-
-        if card['number'] == 2:
-            # Pick two
-            self.pick_cards_from_market(2, 'player')
-            self.message = 'You pick 2! Computer\'s turn again.'
-            # Computer plays again
-            self.computer_play()
-            return
-
-        if card['number'] == 14:
-            # General Market
-            self.pick_cards_from_market(1, 'player')
-            self.message = 'General Market! You pick 1. Computer\'s turn again.'
-            # Computer plays again
-            self.computer_play()
-            return
-
-        self.message = 'Computer played a card. Your turn!'
-
-# Main game loop
-
-
-def main():
-    clock = pygame.time.Clock()
-    game = WhotGame()
-    computer_turn_timer = 0
-    waiting_for_computer = False
-
-    # Helper function to draw a card
-    def draw_card(card, x, y, selected=False):
-        # Draw card background
-        border_color = WHITE
-        if selected:
-            border_color = (255, 215, 0)  # Gold for selected card
-
-        pygame.draw.rect(screen, WHITE, (x, y, CARD_WIDTH, CARD_HEIGHT))
-        pygame.draw.rect(screen, border_color,
-                         (x, y, CARD_WIDTH, CARD_HEIGHT), 3)
-
-        # Draw card shape and number
-        shape = card['shape']
-        number = card['number']
-        color = SHAPES[shape]
-
-        # Draw number at top-left and bottom-right
-        number_text = font.render(str(number), True, color)
-        screen.blit(number_text, (x + 5, y + 5))
-        screen.blit(number_text, (x + CARD_WIDTH - 25, y + CARD_HEIGHT - 30))
-
-        # Draw shape symbol in center
-        if shape == 'circle':
-            pygame.draw.circle(
-                screen, color, (x + CARD_WIDTH//2, y + CARD_HEIGHT//2), 20)
-        elif shape == 'triangle':
-            points = [(x + CARD_WIDTH//2, y + CARD_HEIGHT//2 - 20),
-                      (x + CARD_WIDTH//2 - 20, y + CARD_HEIGHT//2 + 10),
-                      (x + CARD_WIDTH//2 + 20, y + CARD_HEIGHT//2 + 10)]
-            pygame.draw.polygon(screen, color, points)
-        elif shape == 'cross':
-            pygame.draw.line(screen, color, (x + CARD_WIDTH//2 - 15, y + CARD_HEIGHT//2),
-                             (x + CARD_WIDTH//2 + 15, y + CARD_HEIGHT//2), 5)
-            pygame.draw.line(screen, color, (x + CARD_WIDTH//2, y + CARD_HEIGHT//2 - 15),
-                             (x + CARD_WIDTH//2, y + CARD_HEIGHT//2 + 15), 5)
-        elif shape == 'square':
-            pygame.draw.rect(screen, color, (x + CARD_WIDTH //
-                             2 - 15, y + CARD_HEIGHT//2 - 15, 30, 30))
-        elif shape == 'star':
-            # Simple star representation
-            pygame.draw.polygon(screen, color, [
-                (x + CARD_WIDTH//2, y + CARD_HEIGHT//2 - 20),  # Top point
-                (x + CARD_WIDTH//2 + 5, y + CARD_HEIGHT//2 - 5),
-                (x + CARD_WIDTH//2 + 20, y + CARD_HEIGHT//2 - 5),  # Right top
-                (x + CARD_WIDTH//2 + 8, y + CARD_HEIGHT//2 + 5),
-                (x + CARD_WIDTH//2 + 15, y + CARD_HEIGHT//2 + 20),  # Right bottom
-                (x + CARD_WIDTH//2, y + CARD_HEIGHT//2 + 10),
-                (x + CARD_WIDTH//2 - 15, y + CARD_HEIGHT//2 + 20),  # Left bottom
-                (x + CARD_WIDTH//2 - 8, y + CARD_HEIGHT//2 + 5),
-                (x + CARD_WIDTH//2 - 20, y + CARD_HEIGHT//2 - 5),  # Left top
-                (x + CARD_WIDTH//2 - 5, y + CARD_HEIGHT//2 - 5)
-            ])
-        elif shape == 'whot':
-            whot_text = large_font.render('W', True, color)
-            screen.blit(whot_text, (x + CARD_WIDTH //
-                        2 - 10, y + CARD_HEIGHT//2 - 15))
-
-    # Game loop
-    running = True
-    while running:
-        # Fill the background
-        screen.fill(BG_COLOR)
-
-        # Process events
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
-
-            if event.type == MOUSEBUTTONDOWN and event.button == 1:  # Left mouse button
-                mouse_x, mouse_y = event.pos
-
-                if game.game_status == 'playing' and not waiting_for_computer:
-                    # Check if player clicked on a card in their hand
-                    card_spacing = min(
-                        CARD_WIDTH, (SCREEN_WIDTH - 100) // max(1, len(game.player_hand)))
-                    for i in range(len(game.player_hand)):
-                        card_x = 50 + i * card_spacing
-                        card_y = SCREEN_HEIGHT - CARD_HEIGHT - 50
-                        card_rect = pygame.Rect(
-                            card_x, card_y, CARD_WIDTH, CARD_HEIGHT)
-
-                        if card_rect.collidepoint(mouse_x, mouse_y):
-                            if game.play_card(i):
-                                # Card was played successfully
-                                if game.message.startswith('Computer\'s turn'):
-                                    computer_turn_timer = pygame.time.get_ticks()
-                                    waiting_for_computer = True
-                            break
-
-                    # Check if player clicked on market pile
-                    market_x = SCREEN_WIDTH - CARD_WIDTH - 50
-                    market_y = SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2
-                    market_rect = pygame.Rect(
-                        market_x, market_y, CARD_WIDTH, CARD_HEIGHT)
-
-                    if market_rect.collidepoint(mouse_x, mouse_y):
-                        if game.pick_from_market():
-                            computer_turn_timer = pygame.time.get_ticks()
-                            waiting_for_computer = True
-
-                elif game.game_status == 'whotRequest':
-                    # Check if player clicked on a shape button
-                    button_width = 100
-                    button_height = 40
-                    button_spacing = 20
-                    button_y = 400
-
-                    # All except whot
-                    for i, shape in enumerate(list(SHAPES.keys())[:-1]):
-                        button_x = 150 + i * (button_width + button_spacing)
-                        button_rect = pygame.Rect(
-                            button_x, button_y, button_width, button_height)
-
-                        if button_rect.collidepoint(mouse_x, mouse_y):
-                            if game.request_shape(shape):
-                                computer_turn_timer = pygame.time.get_ticks()
-                                waiting_for_computer = True
-                            break
-
-                elif game.game_status == 'ended':
-                    # Check if player clicked on restart button
-                    button_x = SCREEN_WIDTH // 2 - 75
-                    button_y = SCREEN_HEIGHT // 2 + 50
-                    button_rect = pygame.Rect(button_x, button_y, 150, 50)
-
-                    if button_rect.collidepoint(mouse_x, mouse_y):
-                        game = WhotGame()  # Reset the game
-                        waiting_for_computer = False
-
-        # Computer's turn logic
-        if waiting_for_computer and game.game_status == 'playing':
-            current_time = pygame.time.get_ticks()
-            if current_time - computer_turn_timer > 1000:  # Wait 1 second before computer plays
-                game.computer_play()
-                waiting_for_computer = False
-
-        # Draw game elements
-
-        # Draw message - FIX: Clear background behind text
-        message_text = large_font.render(game.message, True, WHITE)
-        message_bg_rect = pygame.Rect(
-            SCREEN_WIDTH // 2 - message_text.get_width() // 2 - 10,
-            20 - 5,
-            message_text.get_width() + 20,
-            message_text.get_height() + 10
-        )
-        pygame.draw.rect(screen, BG_COLOR, message_bg_rect)  # Clear background
-        screen.blit(message_text, (SCREEN_WIDTH // 2 -
-                    message_text.get_width() // 2, 20))
-
-        # Draw play pile
-        if game.play_pile:
-            top_card = game.play_pile[-1]
-            draw_card(top_card, SCREEN_WIDTH // 2 - CARD_WIDTH //
-                      2, SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2)
-
-        # Draw market pile (face down)
-        if game.market_pile:
-            market_x = SCREEN_WIDTH - CARD_WIDTH - 50
-            market_y = SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2
-            pygame.draw.rect(
-                screen, BLUE, (market_x, market_y, CARD_WIDTH, CARD_HEIGHT))
-            pygame.draw.rect(
-                screen, WHITE, (market_x, market_y, CARD_WIDTH, CARD_HEIGHT), 3)
-            market_text = font.render(
-                f'Market ({len(game.market_pile)})', True, WHITE)
-
-            # FIX: Clear background behind text
-            market_bg_rect = pygame.Rect(
-                market_x - 10 - 5,
-                market_y - 30 - 5,
-                market_text.get_width() + 10,
-                market_text.get_height() + 10
-            )
-            # Clear background
-            pygame.draw.rect(screen, BG_COLOR, market_bg_rect)
-            screen.blit(market_text, (market_x - 10, market_y - 30))
-
-        # Draw player's hand
-        card_spacing = min(CARD_WIDTH, (SCREEN_WIDTH - 100) //
-                           max(1, len(game.player_hand)))
-        for i, card in enumerate(game.player_hand):
-            card_x = 50 + i * card_spacing
-            card_y = SCREEN_HEIGHT - CARD_HEIGHT - 50
-            draw_card(card, card_x, card_y, selected=(i == game.selected_card))
-
-        # Draw computer's hand (face down)
-        card_spacing = min(CARD_WIDTH, (SCREEN_WIDTH - 100) //
-                           max(1, len(game.computer_hand)))
-        for i in range(len(game.computer_hand)):
-            card_x = 50 + i * card_spacing
-            card_y = 50
-            pygame.draw.rect(
-                screen, RED, (card_x, card_y, CARD_WIDTH, CARD_HEIGHT))
-            pygame.draw.rect(screen, WHITE, (card_x, card_y,
-                             CARD_WIDTH, CARD_HEIGHT), 3)
-
-        # Draw computer hand count
-        computer_text = font.render(
-            f'Computer: {len(game.computer_hand)} cards', True, WHITE)
-        # FIX: Clear background behind text
-        computer_bg_rect = pygame.Rect(
-            50 - 5,
-            20 - 5,
-            computer_text.get_width() + 10,
-            computer_text.get_height() + 10
-        )
-        # Clear background
-        pygame.draw.rect(screen, BG_COLOR, computer_bg_rect)
-        screen.blit(computer_text, (50, 20))
-
-        # Draw Whot shape request buttons if needed
-        if game.game_status == 'whotRequest':
-            # FIX: Add a background for the buttons to make them more visible
-            instruction_text = font.render(
-                "Select a shape to request:", True, WHITE)
-            instruction_bg_rect = pygame.Rect(
-                SCREEN_WIDTH // 2 - instruction_text.get_width() // 2 - 5,
-                360 - 5,
-                instruction_text.get_width() + 10,
-                instruction_text.get_height() + 10
-            )
-            pygame.draw.rect(screen, BG_COLOR, instruction_bg_rect)
-            screen.blit(instruction_text, (SCREEN_WIDTH // 2 -
-                        instruction_text.get_width() // 2, 360))
-
-            button_width = 100
-            button_height = 40
-            button_spacing = 20
-            button_y = 400
-
-            # All except whot
-            for i, shape in enumerate(list(SHAPES.keys())[:-1]):
-                button_x = 150 + i * (button_width + button_spacing)
-
-                # Draw button
-                pygame.draw.rect(
-                    screen, SHAPES[shape], (button_x, button_y, button_width, button_height))
-                pygame.draw.rect(
-                    screen, WHITE, (button_x, button_y, button_width, button_height), 2)
-
-                # Draw button text
-                button_text = font.render(shape, True, WHITE)
-                screen.blit(button_text, (button_x + button_width//2 - button_text.get_width()//2,
-                                          button_y + button_height//2 - button_text.get_height()//2))
-
-        # Draw restart button if game ended
-        if game.game_status == 'ended':
-            button_x = SCREEN_WIDTH // 2 - 75
-            button_y = SCREEN_HEIGHT // 2 + 50
-
-            pygame.draw.rect(screen, GREEN, (button_x, button_y, 150, 50))
-            pygame.draw.rect(screen, WHITE, (button_x, button_y, 150, 50), 2)
-
-            button_text = font.render('Play Again', True, WHITE)
-            screen.blit(button_text, (button_x + 75 - button_text.get_width()//2,
-                                      button_y + 25 - button_text.get_height()//2))
-
-        # Draw Whot shape request indicator if active
-        if game.whot_shape_request:
-            request_text = font.render(
-                f'Requested shape: {game.whot_shape_request}', True, WHITE)
-            # FIX: Clear background behind text
-            request_bg_rect = pygame.Rect(
-                SCREEN_WIDTH // 2 - request_text.get_width() // 2 - 5,
-                60 - 5,
-                request_text.get_width() + 10,
-                request_text.get_height() + 10
-            )
-            # Clear background
-            pygame.draw.rect(screen, BG_COLOR, request_bg_rect)
-            screen.blit(request_text, (SCREEN_WIDTH // 2 -
-                        request_text.get_width() // 2, 60))
-
-        # Update the display
-        pygame.display.flip()
-        clock.tick(60)
-
-
-if __name__ == '__main__':
-    main()
+import argparse
+import copy
+import hashlib
+import json
+import os
+import pygame
+import string
+import sys
+import time
+from collections import OrderedDict
+from pygame.locals import *
+
+from whot_engine import (
+    BUILTIN_AI, CARD_NUMBER, CARD_SHAPE, DECK_SIZE, PLAYER, SHAPES, WhotGame,
+    decode_card)
+from whot_profile import Profiler
+from whot_worker import AIWorker, FixedMove
+
+# Reference point for --startup-time
+STARTED = time.perf_counter()
+
+# Screen dimensions
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 255, 0)
+PURPLE = (128, 0, 128)
+BG_COLOR = (50, 150, 100)  # Green table
+
+# Fonts. The system font is looked up once per font setup and the result
+# cached on disk; --font loads a TTF file directly instead.
+FONT_NAME = 'Arial'
+FONT_SIZE = 24
+LARGE_FONT_SIZE = 32
+FONT_CACHE_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'whot', 'fonts.json')
+# Directories whose modification times change when fonts are installed or
+# removed, or when fontconfig rebuilds its cache
+FONT_DIRS = ('/etc/fonts', '/etc/fonts/conf.d', '/usr/share/fonts', '/usr/local/share/fonts',
+             '~/.fonts', '~/.local/share/fonts', '/var/cache/fontconfig',
+             '~/.cache/fontconfig', '/Library/Fonts', '/System/Library/Fonts',
+             '~/Library/Fonts', os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'))
+
+# Card dimensions
+CARD_WIDTH = 80
+CARD_HEIGHT = 120
+
+# How long the main loop sleeps waiting for input when nothing is changing
+IDLE_WAIT_MS = 250
+
+# The computer waits this long before moving, however fast it decides
+COMPUTER_DELAY_MS = 1000
+# Thinking time after which the computer is asked for its best move so far,
+# and the extra grace after which the built-in policy moves instead
+AI_TIME_LIMIT_MS = 5000
+AI_GRACE_MS = 500
+
+# Engine calls timed by the profiler (F3 toggles it). Pick-two and General
+# Market draws go through draw_from_market.
+PROFILED_CALLS = ('play_card', 'pick_from_market', 'request_shape', 'computer_play',
+                  'computer_step', 'draw_from_market')
+# How often the profiler overlay text is refreshed
+OVERLAY_REFRESH_MS = 250
+# Rendered text surfaces kept by TextCache
+TEXT_CACHE_SIZE = 128
+
+# Colors for each card shape
+SHAPE_COLORS = {
+    'circle': RED,
+    'triangle': BLUE,
+    'cross': GREEN,
+    'square': YELLOW,
+    'star': PURPLE,
+    'whot': BLACK
+}
+
+# Card colors; changing any of these rebuilds the card atlas
+DEFAULT_THEME = {
+    'shapes': SHAPE_COLORS,
+    'face': WHITE,
+    'border': WHITE,
+    'selected': (255, 215, 0),  # Gold for selected card
+    'playable': (0, 200, 255),  # Cyan for cards that can be played now
+    'backs': {'market': BLUE, 'hand': RED},
+}
+
+
+def render_card(surface, card, x, y, w, h, font, large_font, theme, selected=False,
+                playable=False):
+    # Draw card background
+    border_color = theme['border']
+    if selected:
+        border_color = theme['selected']
+    elif playable:
+        border_color = theme['playable']
+
+    pygame.draw.rect(surface, theme['face'], (x, y, w, h))
+    pygame.draw.rect(surface, border_color, (x, y, w, h), 3)
+
+    # Draw card shape and number
+    shape = card['shape']
+    number = card['number']
+    color = theme['shapes'][shape]
+
+    # Draw number at top-left and bottom-right
+    number_text = font.render(str(number), True, color)
+    surface.blit(number_text, (x + 5, y + 5))
+    surface.blit(number_text, (x + w - 25, y + h - 30))
+
+    # Draw shape symbol in center
+    if shape == 'circle':
+        pygame.draw.circle(surface, color, (x + w//2, y + h//2), 20)
+    elif shape == 'triangle':
+        points = [(x + w//2, y + h//2 - 20),
+                  (x + w//2 - 20, y + h//2 + 10),
+                  (x + w//2 + 20, y + h//2 + 10)]
+        pygame.draw.polygon(surface, color, points)
+    elif shape == 'cross':
+        pygame.draw.line(surface, color, (x + w//2 - 15, y + h//2),
+                         (x + w//2 + 15, y + h//2), 5)
+        pygame.draw.line(surface, color, (x + w//2, y + h//2 - 15),
+                         (x + w//2, y + h//2 + 15), 5)
+    elif shape == 'square':
+        pygame.draw.rect(surface, color, (x + w//2 - 15, y + h//2 - 15, 30, 30))
+    elif shape == 'star':
+        # Simple star representation
+        pygame.draw.polygon(surface, color, [
+            (x + w//2, y + h//2 - 20),  # Top point
+            (x + w//2 + 5, y + h//2 - 5),
+            (x + w//2 + 20, y + h//2 - 5),  # Right top
+            (x + w//2 + 8, y + h//2 + 5),
+            (x + w//2 + 15, y + h//2 + 20),  # Right bottom
+            (x + w//2, y + h//2 + 10),
+            (x + w//2 - 15, y + h//2 + 20),  # Left bottom
+            (x + w//2 - 8, y + h//2 + 5),
+            (x + w//2 - 20, y + h//2 - 5),  # Left top
+            (x + w//2 - 5, y + h//2 - 5)
+        ])
+    elif shape == 'whot':
+        whot_text = large_font.render('W', True, color)
+        surface.blit(whot_text, (x + w//2 - 10, y + h//2 - 15))
+
+
+def render_card_back(surface, color, x, y, w, h, theme):
+    pygame.draw.rect(surface, color, (x, y, w, h))
+    pygame.draw.rect(surface, theme['border'], (x, y, w, h), 3)
+
+
+class CardAtlas:
+    # Every distinct card face (shape x number x border) and card back,
+    # rendered once into a single surface. Cards are then drawn with one
+    # blit; the atlas is rebuilt only when the card size or theme changes.
+
+    def __init__(self, font, large_font):
+        self.font = font
+        self.large_font = large_font
+        self.key = None
+        self.surface = None
+        self.rects = {}
+
+    def update(self, card_width, card_height, theme):
+        key = (card_width, card_height, theme)
+        if key != self.key:
+            self.build(card_width, card_height, theme)
+            self.key = (card_width, card_height, copy.deepcopy(theme))
+
+    def build(self, w, h, theme):
+        faces = [(SHAPES[CARD_SHAPE[c]], CARD_NUMBER[c]) for c in range(DECK_SIZE)]
+        faces = list(dict.fromkeys(faces))  # the Whot cards share one face
+        entries = [(face, selected, playable) for face in faces
+                   for selected in (False, True) for playable in (False, True)]
+        entries += [('back', back) for back in theme['backs']]
+
+        columns = 16
+        rows = (len(entries) + columns - 1) // columns
+        self.surface = pygame.Surface((columns * w, rows * h)).convert()
+        self.rects = {}
+        for i, entry in enumerate(entries):
+            x = (i % columns) * w
+            y = (i // columns) * h
+            if entry[0] == 'back':
+                render_card_back(self.surface, theme['backs'][entry[1]], x, y, w, h, theme)
+            else:
+                (shape, number), selected, playable = entry
+                render_card(self.surface, {'shape': shape, 'number': number}, x, y, w, h,
+                            self.font, self.large_font, theme, selected, playable)
+            self.rects[entry] = pygame.Rect(x, y, w, h)
+
+    def draw(self, screen, card, x, y, selected=False, playable=False):
+        rect = self.rects[((card['shape'], card['number']), selected, playable)]
+        screen.blit(self.surface, (x, y), rect)
+
+    def draw_back(self, screen, back, x, y):
+        screen.blit(self.surface, (x, y), self.rects[('back', back)])
+
+
+class TextCache:
+    # Bounded LRU of rendered text surfaces keyed by (text, font, colour),
+    # so a string is rasterized only the first time it is shown (or after
+    # it has been evicted)
+
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (text, font, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = font.render(text, True, color)
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class GlyphCache:
+    # One pre-rendered surface per printable character. Labels built from
+    # these (counts, frame times) cost a few blits when their numbers
+    # change instead of a new rasterization.
+
+    def __init__(self, font, color, chars=string.printable.strip() + ' '):
+        self.height = font.get_height()
+        self.glyphs = {ch: font.render(ch, True, color) for ch in chars}
+
+    def render(self, text):
+        glyphs = [self.glyphs[ch] for ch in text]
+        surface = pygame.Surface((sum(g.get_width() for g in glyphs), self.height),
+                                 pygame.SRCALPHA)
+        x = 0
+        for glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        return surface
+
+
+class RegionRenderer:
+    # Retained-mode renderer. Each region has a fixed screen rect, a key
+    # function describing what it currently shows and a draw function.
+    # render() redraws only regions whose key changed, plus any regions
+    # overlapping them (in draw order), and returns the rects to update.
+
+    _UNSET = object()
+
+    def __init__(self, screen, background, profiler=None):
+        self.screen = screen
+        self.background = background
+        self.profiler = Profiler() if profiler is None else profiler
+        self.regions = []
+        self.keys = []
+        self.full = True
+
+    def add(self, rect, key, draw):
+        self.regions.append((pygame.Rect(rect), key, draw))
+        self.keys.append(self._UNSET)
+
+    def invalidate(self):
+        # Repaint the whole screen on the next render
+        self.full = True
+
+    def render(self):
+        keys = [key() for _, key, _ in self.regions]
+        if self.full:
+            dirty = set(range(len(self.regions)))
+        else:
+            dirty = {i for i, key in enumerate(keys) if key != self.keys[i]}
+            if not dirty:
+                return []
+
+            # Redrawing a region clears it, so anything overlapping it has
+            # to be redrawn as well
+            grown = True
+            while grown:
+                grown = False
+                for i, (rect, _, _) in enumerate(self.regions):
+                    if i not in dirty and any(rect.colliderect(self.regions[j][0]) for j in dirty):
+                        dirty.add(i)
+                        grown = True
+
+        order = sorted(dirty)
+        profiler = self.profiler
+        with profiler.span('fill'):
+            if self.full:
+                self.screen.fill(self.background)
+                rects = [self.screen.get_rect()]
+            else:
+                rects = [self.regions[i][0] for i in order]
+                for rect in rects:
+                    self.screen.fill(self.background, rect)
+        for i in order:
+            rect, _, draw = self.regions[i]
+            self.screen.set_clip(rect)
+            with profiler.span(draw.__name__):
+                draw()
+        self.screen.set_clip(None)
+
+        self.keys = keys
+        self.full = False
+        return rects
+
+
+class Layout:
+    # Screen rects for every card, pile and button. Rendering and mouse
+    # hit-testing both read from here; hand rects are recomputed only when
+    # a hand size changes, and hits are found by computing the slot from
+    # the click position rather than testing each rect in turn.
+
+    HAND_X = 50
+    PLAYER_Y = SCREEN_HEIGHT - CARD_HEIGHT - 50
+    COMPUTER_Y = 50
+    BUTTON_X = 150
+    BUTTON_Y = 400
+    BUTTON_WIDTH = 100
+    BUTTON_HEIGHT = 40
+    BUTTON_SPACING = 20
+
+    def __init__(self):
+        self.play_pile = pygame.Rect(SCREEN_WIDTH // 2 - CARD_WIDTH // 2,
+                                     SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2,
+                                     CARD_WIDTH, CARD_HEIGHT)
+        self.market = pygame.Rect(SCREEN_WIDTH - CARD_WIDTH - 50,
+                                  SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2,
+                                  CARD_WIDTH, CARD_HEIGHT)
+        # All except whot
+        self.shape_buttons = [
+            pygame.Rect(self.BUTTON_X + i * (self.BUTTON_WIDTH + self.BUTTON_SPACING),
+                        self.BUTTON_Y, self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+            for i in range(len(SHAPES) - 1)]
+        self.restart_button = pygame.Rect(SCREEN_WIDTH // 2 - 75, SCREEN_HEIGHT // 2 + 50, 150, 50)
+
+        self.sizes = None
+        self.update(0, 0)
+
+    @staticmethod
+    def card_spacing(count):
+        return min(CARD_WIDTH, (SCREEN_WIDTH - 100) // max(1, count))
+
+    def hand_rects(self, count, y):
+        spacing = self.card_spacing(count)
+        return [pygame.Rect(self.HAND_X + i * spacing, y, CARD_WIDTH, CARD_HEIGHT)
+                for i in range(count)]
+
+    def update(self, player_count, computer_count):
+        if (player_count, computer_count) == self.sizes:
+            return
+        self.sizes = (player_count, computer_count)
+        self.player_spacing = self.card_spacing(player_count)
+        self.player_cards = self.hand_rects(player_count, self.PLAYER_Y)
+        self.computer_cards = self.hand_rects(computer_count, self.COMPUTER_Y)
+
+    def player_card_at(self, x, y):
+        # Index of the top-most hand card under (x, y), or None
+        count = len(self.player_cards)
+        offset = x - self.HAND_X
+        if not count or offset < 0 or not self.PLAYER_Y <= y < self.PLAYER_Y + CARD_HEIGHT:
+            return None
+        i = min(offset // self.player_spacing, count - 1)
+        if offset < i * self.player_spacing + CARD_WIDTH:
+            return i
+        return None
+
+    def shape_button_at(self, x, y):
+        # Shape index of the request button under (x, y), or None
+        offset = x - self.BUTTON_X
+        if offset < 0 or not self.BUTTON_Y <= y < self.BUTTON_Y + self.BUTTON_HEIGHT:
+            return None
+        i, inside = divmod(offset, self.BUTTON_WIDTH + self.BUTTON_SPACING)
+        if i < len(self.shape_buttons) and inside < self.BUTTON_WIDTH:
+            return i
+        return None
+
+
+class GameView:
+    # Everything drawn for one game: layout, card atlas and the screen
+    # regions. main() points game at the current WhotGame and sets waiting
+    # while the computer is to move; render() redraws what changed.
+
+    def __init__(self, screen, font, large_font, game, profiler=None):
+        self.screen = screen
+        self.font = font
+        self.large_font = large_font
+        self.game = game
+        self.waiting = False
+        self.profiler = Profiler() if profiler is None else profiler
+        self.overlay = None  # profiler overlay text, refreshed a few times a second
+        self.overlay_updated = 0
+
+        # Text: messages and fixed labels through an LRU of rendered
+        # strings, counts through pre-rendered glyphs
+        self.text = TextCache()
+        self.glyphs = GlyphCache(font, WHITE)
+        for label in ['Select a shape to request:', 'Play Again', *SHAPES[:-1]]:
+            self.text.render(font, label, WHITE)
+
+        # Positions of everything on screen
+        self.layout = Layout()
+
+        # Pre-rendered card faces
+        self.atlas = CardAtlas(font, large_font)
+        self.atlas.update(CARD_WIDTH, CARD_HEIGHT, DEFAULT_THEME)
+
+        # Screen regions in draw order: rect, what the region shows, how to draw it
+        market_x, market_y = self.layout.market.topleft
+        renderer = self.renderer = RegionRenderer(screen, BG_COLOR, self.profiler)
+        renderer.add((0, 10, SCREEN_WIDTH, 55),
+                     lambda: self.game.message, self.draw_message)
+        renderer.add(self.layout.play_pile,
+                     lambda: self.game.pile[-1] if self.game.pile else None,
+                     self.draw_play_pile)
+        renderer.add((market_x - 20, market_y - 40, SCREEN_WIDTH - market_x + 20,
+                      CARD_HEIGHT + 40),
+                     lambda: len(self.game.market), self.draw_market)
+        renderer.add((0, Layout.PLAYER_Y, SCREEN_WIDTH, CARD_HEIGHT),
+                     lambda: (self.game.player_cards.bits, self.game.selected_card,
+                              self.playable_cards()),
+                     self.draw_player_hand)
+        renderer.add((0, Layout.COMPUTER_Y, SCREEN_WIDTH, CARD_HEIGHT),
+                     lambda: len(self.game.computer_cards), self.draw_computer_hand)
+        renderer.add((40, 10, 260, 45),
+                     lambda: len(self.game.computer_cards), self.draw_computer_count)
+        renderer.add((40, Layout.COMPUTER_Y + CARD_HEIGHT, 300, 40),
+                     self.thinking_dots, self.draw_thinking)
+        renderer.add((0, 350, SCREEN_WIDTH, 95),
+                     lambda: self.game.game_status == 'whotRequest', self.draw_whot_buttons)
+        renderer.add(self.layout.restart_button,
+                     lambda: self.game.game_status == 'ended', self.draw_restart_button)
+        renderer.add((0, 50, SCREEN_WIDTH, 45),
+                     lambda: self.game.whot_shape_request, self.draw_request_indicator)
+        renderer.add((SCREEN_WIDTH - 330, SCREEN_HEIGHT - 45, 330, 40),
+                     self.overlay_text, self.draw_overlay)
+
+    def invalidate(self):
+        self.renderer.invalidate()
+
+    def render(self):
+        # Redraw only the regions that changed; returns the dirty rects
+        self.layout.update(len(self.game.player_cards), len(self.game.computer_cards))
+        return self.renderer.render()
+
+    # Helper function to draw a card
+    def draw_card(self, card, x, y, selected=False, playable=False):
+        self.atlas.draw(self.screen, card, x, y, selected, playable)
+
+    # Draw message - FIX: Clear background behind text
+    def draw_message(self):
+        message_text = self.text.render(self.large_font, self.game.message, WHITE)
+        message_bg_rect = pygame.Rect(
+            SCREEN_WIDTH // 2 - message_text.get_width() // 2 - 10,
+            20 - 5,
+            message_text.get_width() + 20,
+            message_text.get_height() + 10
+        )
+        pygame.draw.rect(self.screen, BG_COLOR, message_bg_rect)  # Clear background
+        self.screen.blit(message_text, (SCREEN_WIDTH // 2 -
+                         message_text.get_width() // 2, 20))
+
+    # Draw play pile
+    def draw_play_pile(self):
+        if self.game.pile:
+            top_card = decode_card(self.game.top_card())
+            self.draw_card(top_card, *self.layout.play_pile.topleft)
+
+    # Draw market pile (face down)
+    def draw_market(self):
+        market_x, market_y = self.layout.market.topleft
+        if self.game.market:
+            self.atlas.draw_back(self.screen, 'market', market_x, market_y)
+            market_text = self.glyphs.render(f'Market ({len(self.game.market)})')
+
+            # FIX: Clear background behind text
+            market_bg_rect = pygame.Rect(
+                market_x - 10 - 5,
+                market_y - 30 - 5,
+                market_text.get_width() + 10,
+                market_text.get_height() + 10
+            )
+            # Clear background
+            pygame.draw.rect(self.screen, BG_COLOR, market_bg_rect)
+            self.screen.blit(market_text, (market_x - 10, market_y - 30))
+
+    # Draw player's hand
+    def playable_cards(self):
+        # Player's playable cards, from the hand's shape/number buckets
+        if self.game.game_status != 'playing' or self.waiting:
+            return 0
+        game = self.game
+        return game.player_cards.playable_against(game.top_card(), game.requested_shape)
+
+    def draw_player_hand(self):
+        playable = self.playable_cards()
+        cards = zip(self.game.player_cards, self.layout.player_cards)
+        for i, (card, rect) in enumerate(cards):
+            self.draw_card(decode_card(card), rect.x, rect.y,
+                           selected=(i == self.game.selected_card),
+                           playable=bool(playable >> card & 1))
+
+    # Draw computer's hand (face down)
+    def draw_computer_hand(self):
+        for rect in self.layout.computer_cards:
+            self.atlas.draw_back(self.screen, 'hand', rect.x, rect.y)
+
+    # Draw computer hand count
+    def draw_computer_count(self):
+        computer_text = self.glyphs.render(f'Computer: {len(self.game.computer_cards)} cards')
+        # FIX: Clear background behind text
+        computer_bg_rect = pygame.Rect(
+            50 - 5,
+            20 - 5,
+            computer_text.get_width() + 10,
+            computer_text.get_height() + 10
+        )
+        # Clear background
+        pygame.draw.rect(self.screen, BG_COLOR, computer_bg_rect)
+        self.screen.blit(computer_text, (50, 20))
+
+    # Draw "thinking" indicator under the computer's hand
+    def thinking_dots(self):
+        if not self.waiting or self.game.game_status != 'playing':
+            return 0
+        return 1 + pygame.time.get_ticks() // 300 % 3
+
+    def draw_thinking(self):
+        dots = self.thinking_dots()
+        if dots:
+            thinking_text = self.text.render(self.font, 'Computer is thinking' + '.' * dots,
+                                             WHITE)
+            self.screen.blit(thinking_text, (50, Layout.COMPUTER_Y + CARD_HEIGHT + 5))
+
+    # Draw Whot shape request buttons if needed
+    def draw_whot_buttons(self):
+        if self.game.game_status == 'whotRequest':
+            # FIX: Add a background for the buttons to make them more visible
+            instruction_text = self.text.render(self.font, 'Select a shape to request:', WHITE)
+            instruction_bg_rect = pygame.Rect(
+                SCREEN_WIDTH // 2 - instruction_text.get_width() // 2 - 5,
+                360 - 5,
+                instruction_text.get_width() + 10,
+                instruction_text.get_height() + 10
+            )
+            pygame.draw.rect(self.screen, BG_COLOR, instruction_bg_rect)
+            self.screen.blit(instruction_text, (SCREEN_WIDTH // 2 -
+                             instruction_text.get_width() // 2, 360))
+
+            # All except whot
+            for shape, rect in zip(SHAPES[:-1], self.layout.shape_buttons):
+                # Draw button
+                pygame.draw.rect(self.screen, SHAPE_COLORS[shape], rect)
+                pygame.draw.rect(self.screen, WHITE, rect, 2)
+
+                # Draw button text
+                button_text = self.text.render(self.font, shape, WHITE)
+                self.screen.blit(button_text, (rect.centerx - button_text.get_width()//2,
+                                               rect.centery - button_text.get_height()//2))
+
+    # Draw restart button if game ended
+    def draw_restart_button(self):
+        if self.game.game_status == 'ended':
+            rect = self.layout.restart_button
+            pygame.draw.rect(self.screen, GREEN, rect)
+            pygame.draw.rect(self.screen, WHITE, rect, 2)
+
+            button_text = self.text.render(self.font, 'Play Again', WHITE)
+            self.screen.blit(button_text, (rect.centerx - button_text.get_width()//2,
+                                           rect.centery - button_text.get_height()//2))
+
+    # Draw Whot shape request indicator if active
+    def draw_request_indicator(self):
+        if self.game.whot_shape_request:
+            request_text = self.text.render(
+                self.font, f'Requested shape: {self.game.whot_shape_request}', WHITE)
+            # FIX: Clear background behind text
+            request_bg_rect = pygame.Rect(
+                SCREEN_WIDTH // 2 - request_text.get_width() // 2 - 5,
+                60 - 5,
+                request_text.get_width() + 10,
+                request_text.get_height() + 10
+            )
+            # Clear background
+            pygame.draw.rect(self.screen, BG_COLOR, request_bg_rect)
+            self.screen.blit(request_text, (SCREEN_WIDTH // 2 -
+                             request_text.get_width() // 2, 60))
+
+    # Draw profiler frame time overlay if enabled
+    def overlay_text(self):
+        if not self.profiler.enabled:
+            self.overlay = None
+            return None
+        now = pygame.time.get_ticks()
+        if self.overlay is None or now - self.overlay_updated >= OVERLAY_REFRESH_MS:
+            self.overlay = self.profiler.overlay_text()
+            self.overlay_updated = now
+        return self.overlay
+
+    def draw_overlay(self):
+        if self.overlay:
+            overlay_text = self.glyphs.render(self.overlay)
+            self.screen.blit(overlay_text, (SCREEN_WIDTH - overlay_text.get_width() - 10,
+                                            SCREEN_HEIGHT - 40))
+
+
+# Main game loop
+
+
+def font_fingerprint():
+    # Identifies the installed font setup; see FONT_DIRS
+    parts = [sys.platform, pygame.version.ver]
+    for directory in FONT_DIRS:
+        path = os.path.expanduser(directory)
+        try:
+            parts.append(f'{path}:{os.stat(path).st_mtime_ns}')
+        except OSError:
+            pass
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()[:16]
+
+
+def resolve_font(name, cache_path=FONT_CACHE_PATH):
+    # File of the system font called name, or None for pygame's default
+    # font. pygame.font.match_font() scans every installed font (fc-list on
+    # Linux), so its answer is cached on disk per name and font setup.
+    key = f'{name}:{font_fingerprint()}'
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache and (cache[key] is None or os.path.exists(cache[key])):
+        return cache[key]
+
+    path = pygame.font.match_font(name)
+    # Keep only entries for the current font setup
+    cache = {k: v for k, v in cache.items() if k.split(':')[-1] == key.split(':')[-1]}
+    cache[key] = path
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError:
+        pass  # read-only home: resolve again next time
+    return path
+
+
+def init_display(font_path=None):
+    # Initialize pygame only when the front end actually starts, so the
+    # rules engine can be imported (and simulated) without a display.
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Whot Card Game')
+
+    # Fonts. font_path 'default' is the font bundled with pygame.
+    if font_path == 'default':
+        font_path = None
+    elif not font_path:
+        font_path = resolve_font(FONT_NAME)
+    return (screen, pygame.font.Font(font_path, FONT_SIZE),
+            pygame.font.Font(font_path, LARGE_FONT_SIZE))
+
+
+def report_startup(marks):
+    # Print how long each startup step took, from when this module loaded
+    previous = STARTED
+    for name, mark in marks:
+        print(f'{name + ":":<20}{(mark - previous) * 1000:8.1f} ms')
+        previous = mark
+    print(f'{"time to first frame:":<20}{(previous - STARTED) * 1000:8.1f} ms')
+
+
+def main(computer_strategy=None, time_limit_ms=AI_TIME_LIMIT_MS, replay_writer=None,
+         profile=False, trace_path=None, font_path=None, startup_time=False,
+         endgame_solver=None):
+    startup = [('imports', time.perf_counter())]
+    screen, font, large_font = init_display(font_path)
+    startup.append(('display + fonts', time.perf_counter()))
+    clock = pygame.time.Clock()
+    profiler = Profiler(enabled=profile)
+
+    def new_game():
+        game = WhotGame(computer_strategy=computer_strategy)
+        # Kept across games, so its table stays warm
+        game.endgame_solver = endgame_solver
+        profiler.instrument(game, PROFILED_CALLS)
+        if replay_writer is not None:
+            replay_writer.record(game)
+        return game
+
+    game = new_game()
+    computer_turn_timer = 0
+    waiting_for_computer = False
+
+    # Computer moves are decided off the main loop
+    worker = AIWorker(computer_strategy)
+    ai_job = None  # worker job for the computer's next move
+    ai_move = None  # strategy that replays the decided move
+    think_started = 0
+
+    # Everything on screen
+    view = GameView(screen, font, large_font, game, profiler)
+    layout = view.layout
+    startup.append(('card atlas + text', time.perf_counter()))
+
+    def save_profile():
+        if trace_path and profiler.events:
+            profiler.save_trace(trace_path)
+            print(profiler.report())
+
+    # Game loop
+    running = True
+    while running:
+        # Process events
+        profiler.begin_frame('events')
+        events = pygame.event.get()
+        for event in events:
+            if event.type == QUIT:
+                if replay_writer is not None:
+                    if game.recorder is not None:
+                        game.recorder.end()
+                    replay_writer.close()
+                save_profile()
+                pygame.quit()
+                sys.exit()
+
+            if event.type == WINDOWEXPOSED:
+                view.invalidate()
+
+            if event.type == KEYDOWN and event.key == K_F3:
+                profiler.toggle()
+                if not profiler.enabled:
+                    save_profile()
+
+            if event.type == MOUSEBUTTONDOWN and event.button == 1:  # Left mouse button
+                mouse_x, mouse_y = event.pos
+                layout.update(len(game.player_cards), len(game.computer_cards))
+
+                if game.game_status == 'playing' and not waiting_for_computer:
+                    # Check if player clicked on a card in their hand
+                    i = layout.player_card_at(mouse_x, mouse_y)
+                    if i is not None and game.play_card(i):
+                        # Card was played successfully
+                        if game.game_status == 'playing' and game.turn != PLAYER:
+                            computer_turn_timer = pygame.time.get_ticks()
+                            waiting_for_computer = True
+
+                    # Check if player clicked on market pile
+                    if layout.market.collidepoint(mouse_x, mouse_y):
+                        if game.pick_from_market() and game.game_status == 'playing':
+                            computer_turn_timer = pygame.time.get_ticks()
+                            waiting_for_computer = True
+
+                elif game.game_status == 'whotRequest':
+                    # Check if player clicked on a shape button
+                    i = layout.shape_button_at(mouse_x, mouse_y)
+                    if i is not None and game.request_shape(SHAPES[i]):
+                        computer_turn_timer = pygame.time.get_ticks()
+                        waiting_for_computer = True
+
+                elif game.game_status == 'ended':
+                    # Check if player clicked on restart button
+                    if layout.restart_button.collidepoint(mouse_x, mouse_y):
+                        game = new_game()  # Reset the game
+                        waiting_for_computer = False
+                        worker.cancel()
+                        ai_job = ai_move = None
+
+        # Computer's turn logic: the worker thinks while frames keep coming
+        profiler.phase('computer')
+        if waiting_for_computer and game.game_status == 'playing':
+            current_time = pygame.time.get_ticks()
+            if ai_job is None:
+                ai_job = worker.submit(game)
+                think_started = current_time
+            if ai_move is None:
+                move = worker.poll()
+                if move is not None:
+                    ai_move = FixedMove(*move)
+                elif current_time - think_started > time_limit_ms:
+                    # Out of time: take the best move so far, or give up on it
+                    worker.stop()
+                    if current_time - think_started > time_limit_ms + AI_GRACE_MS:
+                        worker.cancel()
+                        ai_move = BUILTIN_AI
+
+            # Wait 1 second before computer plays
+            if ai_move is not None and current_time - computer_turn_timer > COMPUTER_DELAY_MS:
+                game.computer_step(ai_move)
+                ai_job = ai_move = None
+                if game.game_status != 'playing' or game.turn == PLAYER:
+                    waiting_for_computer = False
+                else:
+                    # 2s and 14s keep the turn; the follow-up is not delayed
+                    computer_turn_timer = current_time - COMPUTER_DELAY_MS
+
+        # Redraw only the regions that changed
+        profiler.phase('render')
+        view.game = game
+        view.waiting = waiting_for_computer
+        dirty_rects = view.render()
+        profiler.phase('display.update')
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        profiler.end_frame()
+        if startup:
+            startup.append(('first frame', time.perf_counter()))
+            if startup_time:
+                report_startup(startup)
+            startup = None
+
+        # Full frame rate while something is happening (or being profiled);
+        # otherwise sleep until the next event (or IDLE_WAIT_MS) to keep
+        # the CPU idle
+        if events or waiting_for_computer or dirty_rects or profiler.enabled:
+            clock.tick(60)
+        else:
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            if event.type != NOEVENT:
+                pygame.event.post(event)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Whot Card Game')
+    parser.add_argument('--ai', choices=['random', 'ismcts'], default='random',
+                        help='computer opponent')
+    parser.add_argument('--think-time', type=float, default=0.5,
+                        help='seconds the ismcts opponent searches per move')
+    parser.add_argument('--endgame', action='store_true',
+                        help='solve small endgames exactly instead (see whot_endgame.py)')
+    parser.add_argument('--time-limit', type=float, default=AI_TIME_LIMIT_MS / 1000,
+                        help='seconds before the computer must play its best move so far')
+    parser.add_argument('--profile', action='store_true',
+                        help='start with the frame profiler on (F3 toggles it)')
+    parser.add_argument('--trace', metavar='JSON',
+                        help='write a Chrome trace of profiled frames here on exit')
+    parser.add_argument('--font', metavar='TTF',
+                        help="font file to use instead of looking up Arial ('default' for "
+                             "the font bundled with pygame)")
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print how long it took to show the first frame')
+    parser.add_argument('--record', metavar='LOG',
+                        help='append every game to this replay log (see whot_replay.py)')
+    args = parser.parse_args()
+
+    strategy = None
+    if args.ai == 'ismcts':
+        from whot_mcts import ISMCTSStrategy
+        strategy = ISMCTSStrategy(time_budget=args.think_time, workers=os.cpu_count())
+    endgame_solver = None
+    if args.endgame:
+        from whot_endgame import EndgameSolver
+        endgame_solver = EndgameSolver()
+    writer = None
+    if args.record:
+        from whot_replay import ReplayWriter
+        writer = ReplayWriter(args.record)
+    main(strategy, int(args.time_limit * 1000), writer, args.profile, args.trace, args.font,
+         args.startup_time, endgame_solver)
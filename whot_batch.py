@@ -0,0 +1,243 @@
+import argparse
+import time
+
+import numpy as np
+
+from whot_engine import (
+    CARD_NUMBER, CARD_SHAPE, DECK_SIZE, WHOT, GameRandom, WhotGame,
+    playable_mask)
+
+# Batch simulator
+#
+# Plays many AI-vs-AI games in lockstep with NumPy. Every game is a row:
+# hands are boolean card-id masks, the market is the row's shuffled deck
+# plus a draw position, and the RNG is one SplitMix64 state per game. The
+# rules, the AI policy and the order in which random numbers are drawn
+# follow WhotGame exactly, so play_game(seed) and simulate_batch([seed])
+# give the same result.
+
+HAND_SIZE = 7
+MARKET_END = DECK_SIZE - 1  # the last card of the deck starts the play pile
+NO_REQUEST = WHOT  # row of LEGAL used when no shape has been requested
+
+# LEGAL[top, requested] is the playable-card mask for that play pile top
+LEGAL = np.zeros((DECK_SIZE, WHOT + 1, DECK_SIZE), dtype=bool)
+for _top in range(DECK_SIZE):
+    for _req in range(WHOT + 1):
+        _mask = playable_mask(_top, None if _req == NO_REQUEST else _req)
+        LEGAL[_top, _req] = [bool(_mask >> c & 1) for c in range(DECK_SIZE)]
+
+SHAPE_OF = np.array(CARD_SHAPE, dtype=np.int8)
+NUMBER_OF = np.array(CARD_NUMBER, dtype=np.int8)
+# SHAPE_ONE_HOT[card, shape] for counting the shapes in a hand
+SHAPE_ONE_HOT = np.zeros((DECK_SIZE, WHOT), dtype=np.int16)
+for _card in range(DECK_SIZE):
+    if CARD_SHAPE[_card] != WHOT:
+        SHAPE_ONE_HOT[_card, CARD_SHAPE[_card]] = 1
+
+# SplitMix64 constants, matching GameRandom
+_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_S30 = np.uint64(30)
+_S27 = np.uint64(27)
+_S31 = np.uint64(31)
+
+
+def _randrange(state, idx, n):
+    # GameRandom.randrange(n) for the games in idx
+    z = state[idx] + _GAMMA
+    state[idx] = z
+    z = (z ^ (z >> _S30)) * _MIX1
+    z = (z ^ (z >> _S27)) * _MIX2
+    z ^= z >> _S31
+    return (z % np.asarray(n, dtype=np.uint64)).astype(np.int64)
+
+
+def play_game(seed, reshuffle_market=False):
+    # Reference game on WhotGame: both seats use the computer_play policy.
+    # Returns (winner, turns); winner is 0 for the player, 1 for the
+    # computer and -1 if the game stalled (empty market, nobody can play).
+    game = WhotGame(reshuffle_market=reshuffle_market, rng=GameRandom(seed))
+    turns = 0
+    while game.game_status != 'ended':
+        turns += 1
+        game.ai_turn()
+    return (-1 if game.winner is None else game.winner), turns
+
+
+def _simulate_chunk(seeds, log=None):
+    # log, if given, is a dict of lists that gets one array per column and
+    # loop step for every turn played (see TURN_COLUMNS)
+    n = len(seeds)
+    rows = np.arange(n)
+    state = np.array(seeds, dtype=np.uint64)
+
+    # Shuffle every deck with the same Fisher-Yates walk as GameRandom
+    deck = np.tile(np.arange(DECK_SIZE, dtype=np.int8), (n, 1))
+    for i in range(DECK_SIZE - 1, 0, -1):
+        j = _randrange(state, rows, i + 1)
+        swap = deck[rows, j]
+        deck[rows, j] = deck[:, i]
+        deck[:, i] = swap
+
+    # Deal
+    hands = np.zeros((n, 2, DECK_SIZE), dtype=bool)
+    hands[rows[:, None], 0, deck[:, :HAND_SIZE]] = True
+    hands[rows[:, None], 1, deck[:, HAND_SIZE:2 * HAND_SIZE]] = True
+    market_pos = np.full(n, 2 * HAND_SIZE, dtype=np.int8)
+    top = deck[:, MARKET_END].astype(np.int64)
+    requested = np.full(n, NO_REQUEST, dtype=np.int8)
+
+    seat = np.zeros(n, dtype=np.int8)
+    passed = np.zeros(n, dtype=bool)
+    done = np.zeros(n, dtype=bool)
+    winner = np.full(n, -1, dtype=np.int8)
+    turns = np.zeros(n, dtype=np.int32)
+
+    def draw(idx, seats, count):
+        for _ in range(count):
+            has = market_pos[idx] < MARKET_END
+            idx, seats = idx[has], seats[has]
+            hands[idx, seats, deck[idx, market_pos[idx]]] = True
+            market_pos[idx] += 1
+
+    g = rows
+    while len(g):
+        s = seat[g]
+        turns[g] += 1
+        playable = hands[g, s] & LEGAL[top[g], requested[g]]
+        count = np.count_nonzero(playable, axis=1)
+        play = count > 0
+        if log is not None:
+            sizes = np.count_nonzero(hands[g], axis=2).astype(np.int8)
+            log['game'].append(g.astype(np.int32))
+            log['turn'].append(turns[g].astype(np.int16))
+            log['seat'].append(s)
+            log['hand_player'].append(sizes[:, 0])
+            log['hand_computer'].append(sizes[:, 1])
+            log['top_whot'].append(SHAPE_OF[top[g]] == WHOT)
+            log['market'].append(MARKET_END - market_pos[g])
+
+        # Play a random playable card
+        gp, sp = g[play], s[play]
+        k = _randrange(state, gp, count[play])
+        ranks = np.cumsum(playable[play], axis=1, dtype=np.int8)
+        card = np.argmax(ranks > k[:, None], axis=1)
+        if log is not None:
+            played = np.full(len(g), -1, dtype=np.int8)
+            played[play] = card
+            log['card'].append(played)
+        hands[gp, sp, card] = False
+        top[gp] = card
+        passed[gp] = False
+
+        # Check win condition
+        won = ~hands[gp, sp].any(axis=1)
+        done[gp[won]] = True
+        winner[gp[won]] = sp[won]
+        gp, sp, card = gp[~won], sp[~won], card[~won]
+        shape = SHAPE_OF[card]
+        number = NUMBER_OF[card]
+
+        # Whot: request the most common shape left, or a random one
+        whot = shape == WHOT
+        gw, sw = gp[whot], sp[whot]
+        counts = hands[gw, sw].astype(np.int16) @ SHAPE_ONE_HOT
+        choice = np.argmax(counts, axis=1)
+        only_whot = counts.max(axis=1, initial=0) == 0
+        choice[only_whot] = _randrange(state, gw[only_whot], WHOT)
+        requested[gw] = choice
+
+        # Pick two / General Market: the opponent draws, same seat again
+        two = number == 2
+        draw(gp[two], 1 - sp[two], 2)
+        general = number == 14
+        draw(gp[general], 1 - sp[general], 1)
+        again = two | general
+        seat[gp[~again]] = 1 - sp[~again]
+
+        # No playable card: pick from market, or pass if it is empty
+        gd, sd = g[~play], s[~play]
+        has = market_pos[gd] < MARKET_END
+        draw(gd[has], sd[has], 1)
+        passed[gd[has]] = False
+        stuck = gd[~has]
+        done[stuck[passed[stuck]]] = True
+        passed[stuck] = True
+        seat[gd] = 1 - sd
+
+        g = g[~done[g]]
+
+    if log is not None:
+        log['final_market'] = MARKET_END - market_pos
+    return winner, turns
+
+
+# Per-turn columns recorded by simulate_batch(record=True), all taken before
+# the turn's move except card (-1 for a pick or pass)
+TURN_COLUMNS = ('game', 'turn', 'seat', 'hand_player', 'hand_computer', 'card',
+                'top_whot', 'market')
+
+
+def simulate_batch(seeds, chunk_size=32_768, record=False):
+    # Play one game per seed; returns {'winner': ..., 'turns': ...} arrays.
+    # With record, also 'final_market' per game and 'log', a dict of
+    # TURN_COLUMNS arrays with a row per turn; log['game'] indexes seeds.
+    seeds = np.asarray(seeds, dtype=np.uint64)
+    winner = np.empty(len(seeds), dtype=np.int8)
+    turns = np.empty(len(seeds), dtype=np.int32)
+    final_market = np.empty(len(seeds), dtype=np.int8)
+    columns = {name: [] for name in TURN_COLUMNS}
+    for start in range(0, len(seeds), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        log = None
+        if record:
+            log = {name: [] for name in TURN_COLUMNS}
+        winner[chunk], turns[chunk] = _simulate_chunk(seeds[chunk], log)
+        if record:
+            final_market[chunk] = log.pop('final_market')
+            log['game'] = [rows + start for rows in log['game']]
+            for name in TURN_COLUMNS:
+                columns[name].extend(log[name])
+    result = {'winner': winner, 'turns': turns}
+    if record:
+        result['final_market'] = final_market
+        result['log'] = {name: np.concatenate(arrays) if arrays else np.empty(0)
+                         for name, arrays in columns.items()}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch Whot self-play simulator')
+    parser.add_argument('--games', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', type=int, default=0,
+                        help='replay the first N games on WhotGame and compare')
+    args = parser.parse_args()
+
+    seeds = np.arange(args.seed, args.seed + args.games, dtype=np.uint64)
+    start = time.perf_counter()
+    result = simulate_batch(seeds)
+    elapsed = time.perf_counter() - start
+
+    winner, turns = result['winner'], result['turns']
+    print(f'{args.games} games in {elapsed:.2f}s '
+          f'({args.games / elapsed:,.0f} games/s)')
+    print(f'Player wins:   {np.mean(winner == 0):.4f}')
+    print(f'Computer wins: {np.mean(winner == 1):.4f}')
+    print(f'Stalled:       {np.mean(winner == -1):.4f}')
+    print(f'Average turns: {turns.mean():.2f}')
+
+    mismatches = 0
+    for i in range(min(args.check, args.games)):
+        expected = play_game(int(seeds[i]))
+        if expected != (winner[i], turns[i]):
+            mismatches += 1
+    if args.check:
+        print(f'Checked {min(args.check, args.games)} games against WhotGame: '
+              f'{mismatches} mismatches')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from whot_engine import (
+    COMPUTER, DECK_SIZE, GameRandom, GameSnapshot, WhotGame, decode_card)
+
+# Benchmarks
+#
+# Fixed-seed benchmarks for the engine hot paths, whole games and the
+# pygame render path. A benchmark is timed in samples of `ops` operations;
+# it reports ops/s over all samples and per-op percentiles across them.
+# Results are saved as JSON, and --baseline compares ops/s with an earlier
+# run and exits non-zero if anything slowed down by more than --threshold.
+#
+# Render benchmarks use the SDL dummy video driver, so they run headless.
+
+BENCHMARKS = {}
+
+
+def benchmark(name, ops, samples=None):
+    # Register setup(seed) -> (prepare, run): prepare() builds the untimed
+    # input for one sample and run(state) performs ops operations on it
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops, samples)
+        return setup
+    return register
+
+
+def played_positions(seed, count, want=None):
+    # Snapshots of positions from seeded self-play games, optionally only
+    # those for which want(game) is true
+    rng = GameRandom(seed)
+    positions = []
+    while len(positions) < count:
+        game = WhotGame(rng=GameRandom(rng.next()))
+        for _ in range(rng.randrange(40)):
+            if game.game_status != 'playing':
+                break
+            game.ai_turn()
+        if game.game_status == 'playing' and (want is None or want(game)):
+            positions.append(game.snapshot())
+    return positions
+
+
+@benchmark('deal', ops=1000)
+def bench_deal(seed):
+    game = WhotGame(rng=GameRandom(seed))
+
+    def run(_):
+        for _ in range(1000):
+            game.deck = game.create_deck()
+            game.initialize_game()
+    return lambda: None, run
+
+
+@benchmark('can_play_card', ops=10_000)
+def bench_can_play_card(seed):
+    games = [WhotGame.from_snapshot(s) for s in played_positions(seed, 100)]
+    pairs = [(game, card) for game in games for card in range(DECK_SIZE)]
+    pairs = (pairs * (10_000 // len(pairs) + 1))[:10_000]
+
+    def run(_):
+        for game, card in pairs:
+            game.can_play_card(card)
+    return lambda: None, run
+
+
+@benchmark('can_play_card[dict]', ops=10_000)
+def bench_can_play_card_dict(seed):
+    games = [WhotGame.from_snapshot(s) for s in played_positions(seed, 100)]
+    pairs = [(game, decode_card(card)) for game in games for card in range(DECK_SIZE)]
+    pairs = (pairs * (10_000 // len(pairs) + 1))[:10_000]
+
+    def run(_):
+        for game, card in pairs:
+            game.can_play_card(card)
+    return lambda: None, run
+
+
+@benchmark('computer_play', ops=500)
+def bench_computer_play(seed):
+    positions = played_positions(seed, 500, lambda game: game.turn == COMPUTER)
+    rng = GameRandom(seed)
+
+    def prepare():
+        return [WhotGame.from_snapshot(s, rng=rng) for s in positions]
+
+    def run(games):
+        for game in games:
+            game.computer_play()
+    return prepare, run
+
+
+@benchmark('endgame_solve', ops=20)
+def bench_endgame_solve(seed):
+    from whot_endgame import EndgameSolver, endgame_positions
+    games = endgame_positions(seed, 20, EndgameSolver())
+
+    def run(solvers):
+        # A fresh solver per position, so nothing is already in its table
+        for game, solver in zip(games, solvers):
+            solver.best_move(game, game.hands[game.turn])
+    return lambda: [EndgameSolver() for _ in games], run
+
+
+@benchmark('game', ops=200)
+def bench_game(seed):
+    from whot_batch import play_game
+    rng = GameRandom(seed)
+
+    def run(seeds):
+        for game_seed in seeds:
+            play_game(game_seed)
+    return lambda: [rng.next() for _ in range(200)], run
+
+
+@benchmark('batch_game', ops=20_000, samples=5)
+def bench_batch_game(seed):
+    import numpy as np
+    from whot_batch import simulate_batch
+    rng = GameRandom(seed)
+
+    def run(seeds):
+        simulate_batch(seeds)
+    return lambda: np.array([rng.next() for _ in range(20_000)], dtype=np.uint64), run
+
+
+def render_setup(seed, hand_size, whot_request=False, change=None):
+    # One full frame of the game view with hand_size cards in the player's
+    # hand. change(view, i) makes the i-th frame redraw only what it changes
+    # instead of the whole screen.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    import whot2
+
+    screen, font, large_font = whot2.init_display()
+    cards = list(range(DECK_SIZE))
+    GameRandom(seed).shuffle(cards)
+    top = cards.pop()
+    player = cards[:hand_size]
+    computer = cards[hand_size:hand_size + min(7, len(cards) - hand_size)]
+    market = cards[hand_size + len(computer):]
+    snapshot = GameSnapshot(
+        (sum(1 << c for c in player), sum(1 << c for c in computer)), tuple(market), (top,),
+        2 if whot_request else -1, 'whotRequest' if whot_request else 'playing', 0, False)
+    view = whot2.GameView(screen, font, large_font, WhotGame.from_snapshot(snapshot))
+    view.render()
+    frame = [0]
+
+    def run(_):
+        if change is None:
+            view.invalidate()
+        else:
+            change(view, frame[0])
+            frame[0] += 1
+        pygame.display.update(view.render())
+    return lambda: None, run
+
+
+def select_card(view, i):
+    view.game.selected_card = i % len(view.game.player_cards)
+
+
+for _size in (7, 30, 60):
+    benchmark(f'render[{_size}]', ops=1, samples=300)(
+        lambda seed, size=_size: render_setup(seed, size))
+benchmark('render[7,whot]', ops=1, samples=300)(
+    lambda seed: render_setup(seed, 7, whot_request=True))
+benchmark('render[30,select]', ops=1, samples=300)(
+    lambda seed: render_setup(seed, 30, change=select_card))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_benchmark(name, seed=0, samples=30):
+    setup, ops, fixed_samples = BENCHMARKS[name]
+    prepare, run = setup(seed)
+    samples = fixed_samples or samples
+    run(prepare())  # warm up
+    times = []
+    for _ in range(samples):
+        state = prepare()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    per_op = [t / ops for t in times]
+    return {
+        'ops': ops,
+        'samples': samples,
+        'ops_per_sec': ops * samples / sum(times),
+        'p50_us': percentile(per_op, 0.5) * 1e6,
+        'p90_us': percentile(per_op, 0.9) * 1e6,
+        'p99_us': percentile(per_op, 0.99) * 1e6,
+        'max_us': max(per_op) * 1e6,
+    }
+
+
+def compare(results, baseline, threshold):
+    # Names of benchmarks whose ops/s fell by more than threshold
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = result['ops_per_sec'] / old['ops_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'  {name:<22}{change:+8.1%} vs baseline{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whot benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--samples', type=int, default=30)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name!r}; choose from {", ".join(BENCHMARKS)}')
+
+    results = {}
+    print(f'{"benchmark":<22}{"ops/s":>12}{"p50 us":>10}{"p90 us":>10}{"p99 us":>10}')
+    for name in names:
+        result = results[name] = run_benchmark(name, args.seed, args.samples)
+        print(f'{name:<22}{result["ops_per_sec"]:>12,.0f}{result["p50_us"]:>10.2f}'
+              f'{result["p90_us"]:>10.2f}{result["p99_us"]:>10.2f}', flush=True)
+
+    if args.output:
+        report = {'python': sys.version.split()[0], 'platform': platform.platform(),
+                  'seed': args.seed, 'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
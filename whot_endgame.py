@@ -0,0 +1,353 @@
+import argparse
+import math
+import time
+from collections import OrderedDict
+from itertools import combinations
+
+from whot_engine import (
+    CARD_NUMBER, CARD_SHAPE, WHOT, WHOT_MASK, GameRandom, WhotGame,
+    iter_cards)
+from whot_mcts import DRAW, NO_REQUEST, legal_moves, move_card, move_shape
+
+# Exact endgame solver
+#
+# Without market reshuffles a two-seat game only ever gets smaller: every
+# move plays a card, draws one from the market or passes. Once the market
+# is nearly empty and few cards are left, the rest of the game is solved by
+# expectimax with alpha-beta cutoffs: the side to move takes its best move, and market draws are
+# chance nodes averaged over the cards that could come up (the order of
+# the market is unknown to both seats). Values are the chance that the side
+# to move wins, with a stalled game counting half, so the opponent's value
+# is always 1 - value (negamax).
+#
+# The opponent's hand is hidden, so the solver averages over every deal of
+# the unseen cards that matches the hand sizes and the opponent's earlier
+# picks (or max_deals sampled deals when there are more). With an empty
+# market there is exactly one deal and the answer is exact.
+#
+# Solved positions are kept in a bounded transposition table keyed by the
+# position packed into one int; see position_key().
+#
+# The search has no time budget of its own, so the front end can stop it
+# through stop_event (see whot_worker.AIWorker); the move is then picked
+# from the deals that were finished.
+
+# Transposition table memory limit, and the measured cost of one entry
+# (packed key, value and bound tuple, and the OrderedDict link)
+DEFAULT_TABLE_BYTES = 16 << 20
+ENTRY_BYTES = 240
+FIRST_WHOT = (WHOT_MASK & -WHOT_MASK).bit_length() - 1
+
+# How many positions are solved between checks of stop_event
+STOP_CHECK_NODES = 1024
+
+# Transposition table bounds: the stored value is exact, or only a lower
+# or upper bound because the search that produced it was cut off
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def position_key(own, other, market, top, requested, passes):
+    # Pack a position, seen from the side to move, into one int: the two
+    # hands and the market as 65-bit card sets, then top, request and passes
+    return (own | other << 65 | market << 130
+            | top << 195 | requested << 202 | passes << 205)
+
+
+class SearchStopped(Exception):
+    # Raised out of the search once stop_event is set
+    pass
+
+
+class TranspositionTable:
+    # Solved position values, evicting the least recently used entry once
+    # the table would take more than max_bytes
+
+    def __init__(self, max_bytes=DEFAULT_TABLE_BYTES):
+        self.max_entries = max(1, max_bytes // ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+
+class EndgameSolver:
+    # The solver behind WhotGame.endgame_solver, and also a strategy (for
+    # the tournament runner) that plays fallback until it applies.
+    # Positions with at most max_market cards in the market and max_cards
+    # cards in the hands and market together are solved; anything larger
+    # is passed to fallback (the built-in policy when None). Market draws
+    # are what make the search expensive, so with an empty market the
+    # larger max_empty_cards limit applies instead. The table is kept
+    # between moves, so later positions of the same game are mostly
+    # already solved.
+
+    def __init__(self, fallback=None, max_market=3, max_cards=14, max_empty_cards=18,
+                 max_deals=32, table_bytes=DEFAULT_TABLE_BYTES):
+        self.fallback = fallback
+        self.max_market = max_market
+        self.max_cards = max_cards
+        self.max_empty_cards = max_empty_cards
+        self.max_deals = max_deals
+        self.table = TranspositionTable(table_bytes)
+        self.pending_shape = None
+        self.nodes = 0  # positions solved, over the solver's lifetime
+        self._stop_event = None
+
+    @property
+    def stop_event(self):
+        return self._stop_event
+
+    @stop_event.setter
+    def stop_event(self, event):
+        self._stop_event = event
+        if hasattr(self.fallback, 'stop_event'):
+            self.fallback.stop_event = event
+
+    def applies(self, game):
+        market = len(game.market)
+        limit = self.max_cards if market else self.max_empty_cards
+        return (game.num_players == 2 and not game.reshuffle_market
+                and game.game_status == 'playing' and market <= self.max_market
+                and sum(len(hand) for hand in game.hands) + market <= limit)
+
+    def deals(self, game, hand):
+        # (opponent hand, market) card sets for every plausible deal of the
+        # unseen cards, or max_deals sampled ones drawn with the game's rng
+        tracker = game.tracker
+        unseen = tracker.unseen(hand)
+        seat = 1 - game.turn
+        size = len(game.hands[seat])
+        if math.comb(unseen.bit_count(), size) <= self.max_deals:
+            hands = [sum(1 << card for card in cards)
+                     for cards in combinations(iter_cards(unseen), size)]
+            # Skip deals the opponent's earlier picks rule out
+            hands = [bits for bits in hands if tracker.consistent(seat, bits)] or hands
+        else:
+            hands = [tracker.sample(hand, {seat: size}, game.rng)[0][seat]
+                     for _ in range(self.max_deals)]
+        for opponent in hands:
+            yield opponent, unseen & ~opponent
+
+    def move_values(self, game, hand):
+        # {move: chance to win} for the side to move, averaged over deals.
+        # If stop_event is set first, only the deals finished so far count,
+        # or the moves finished in the first deal if none was.
+        top = game.pile[-1]
+        requested = NO_REQUEST if game.requested_shape is None else game.requested_shape
+        passes = min(game.passes, 1)
+        moves = legal_moves(hand.bits, top, requested)
+        totals = dict.fromkeys(moves, 0.0)
+        deals = 0
+        values = {}
+        try:
+            for opponent, market in self.deals(game, hand):
+                values = {}
+                for move in moves:
+                    values[move] = self.move_value(hand.bits, opponent, market, top,
+                                                   requested, passes, move)
+                for move, value in values.items():
+                    totals[move] += value
+                deals += 1
+        except SearchStopped:
+            if not deals:
+                return values
+        return {move: total / deals for move, total in totals.items()}
+
+    def best_move(self, game, hand):
+        # Best move, or None if the search was stopped before it had one
+        values = self.move_values(game, hand)
+        if not values:
+            return None
+        return max(values, key=values.get)
+
+    def value(self, own, other, market, top, requested, passes, alpha=0.0, beta=1.0):
+        # Chance that the side to move wins. Alpha-beta: a result at or
+        # below alpha is only an upper bound, one at or above beta only a
+        # lower bound.
+        if CARD_SHAPE[top] == WHOT:
+            top = FIRST_WHOT
+        else:
+            requested = NO_REQUEST
+        key = position_key(own, other, market, top, requested, passes)
+        entry = self.table.get(key)
+        if entry is not None:
+            value, bound = entry
+            if (bound == EXACT or (bound == LOWER and value >= beta)
+                    or (bound == UPPER and value <= alpha)):
+                return value
+
+        self.nodes += 1
+        if (self._stop_event is not None and not self.nodes % STOP_CHECK_NODES
+                and self._stop_event.is_set()):
+            raise SearchStopped
+        best = 0.0
+        for move in legal_moves(own, top, requested):
+            value = self.move_value(own, other, market, top, requested, passes, move,
+                                    max(alpha, best), beta)
+            if value > best:
+                best = value
+                if best >= beta:
+                    break
+        if best >= beta:
+            bound = LOWER
+        elif best <= alpha:
+            bound = UPPER
+        else:
+            bound = EXACT
+        self.table.put(key, (best, bound))
+        return best
+
+    def move_value(self, own, other, market, top, requested, passes, move,
+                   alpha=0.0, beta=1.0):
+        # Chance that the side to move wins after making move
+        if move == DRAW:
+            if market:
+                outcomes = []
+                for card in iter_cards(market):
+                    bit = 1 << card
+                    outcomes.append((other, own | bit, market ^ bit, top, requested, True))
+                return self.chance(outcomes, alpha, beta)
+            if passes:
+                return 0.5  # neither seat can move: stalled
+            return 1.0 - self.value(other, own, 0, top, requested, 1, 1.0 - beta, 1.0 - alpha)
+
+        card = move >> 3
+        own &= ~(1 << card)
+        if not own:
+            return 1.0
+        if CARD_SHAPE[card] == WHOT:
+            return 1.0 - self.value(other, own, market, card, move & 7, 0,
+                                    1.0 - beta, 1.0 - alpha)
+        number = CARD_NUMBER[card]
+        if number != 2 and number != 14:
+            return 1.0 - self.value(other, own, market, card, NO_REQUEST, 0,
+                                    1.0 - beta, 1.0 - alpha)
+
+        # Pick two / General Market: the opponent draws, then play again
+        count = min(2 if number == 2 else 1, market.bit_count())
+        if not count:
+            return self.value(own, other, 0, card, NO_REQUEST, 0, alpha, beta)
+        outcomes = []
+        for cards in combinations(iter_cards(market), count):
+            drawn = sum(1 << c for c in cards)
+            outcomes.append((own, other | drawn, market & ~drawn, card, NO_REQUEST, False))
+        return self.chance(outcomes, alpha, beta)
+
+    def chance(self, outcomes, alpha, beta):
+        # Average value of equally likely outcomes (position, whether the
+        # other seat moves next). Stops as soon as the average is known to
+        # fall outside (alpha, beta), assuming the rest score 1 or 0.
+        n = len(outcomes)
+        total = 0.0
+        for i, (own, other, market, top, requested, flip) in enumerate(outcomes):
+            low = n * alpha - total - (n - i - 1)
+            high = n * beta - total
+            child_low = max(low, 0.0)
+            child_high = min(high, 1.0)
+            if flip:
+                value = 1.0 - self.value(own, other, market, top, requested, 0,
+                                         1.0 - child_high, 1.0 - child_low)
+            else:
+                value = self.value(own, other, market, top, requested, 0,
+                                   child_low, child_high)
+            total += value
+            if value <= low:
+                return (total + n - i - 1) / n
+            if value >= high:
+                return total / n
+        return total / n
+
+    def choose_card(self, game, hand):
+        self.pending_shape = None
+        if not self.applies(game):
+            return self.fallback_card(game, hand)
+        if not hand.playable(game.playable_mask()):
+            return None
+        move = self.best_move(game, hand)
+        if move is None:
+            return self.fallback_card(game, hand)
+        if move == DRAW:
+            return None
+        self.pending_shape = move_shape(move)
+        return move_card(move)
+
+    def fallback_card(self, game, hand):
+        if self.fallback is None:
+            return game.choose_card(hand)
+        return self.fallback.choose_card(game, hand)
+
+    def choose_shape(self, game, hand):
+        if self.pending_shape is not None:
+            return self.pending_shape
+        if self.fallback is None:
+            return game.choose_shape(hand)
+        return self.fallback.choose_shape(game, hand)
+
+
+def endgame_positions(seed, count, solver):
+    # Games played with the built-in policy until the solver would take over
+    rng = GameRandom(seed)
+    games = []
+    while len(games) < count:
+        game = WhotGame(rng=GameRandom(rng.next()))
+        while game.game_status == 'playing':
+            if solver.applies(game):
+                games.append(game)
+                break
+            game.ai_turn()
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the Whot endgame solver')
+    parser.add_argument('--positions', type=int, default=100)
+    parser.add_argument('--max-market', type=int, default=3)
+    parser.add_argument('--max-cards', type=int, default=14)
+    parser.add_argument('--max-empty-cards', type=int, default=18)
+    parser.add_argument('--max-deals', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    def new_solver():
+        return EndgameSolver(max_market=args.max_market, max_cards=args.max_cards,
+                             max_empty_cards=args.max_empty_cards,
+                             max_deals=args.max_deals)
+
+    times = []
+    nodes = 0
+    for game in endgame_positions(args.seed, args.positions, new_solver()):
+        solver = new_solver()
+        start = time.perf_counter()
+        solver.best_move(game, game.hands[game.turn])
+        times.append(time.perf_counter() - start)
+        nodes += solver.nodes
+    times.sort()
+    print(f'{len(times)} positions with up to {args.max_market} cards in the market '
+          f'and {args.max_cards} in play')
+    print(f'  positions solved: {nodes / len(times):,.0f} per move')
+    print('  time per move:    ' + '  '.join(
+        f'{label} {times[min(len(times) - 1, int(q * len(times)))] * 1000:.1f}ms'
+        for label, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,797 @@
+import random
+import struct
+from collections import deque
+from itertools import islice
+from typing import NamedTuple
+
+# Card shapes, in deck order. 'whot' is always last.
+SHAPES = ('circle', 'triangle', 'cross', 'square', 'star', 'whot')
+SHAPE_INDEX = {shape: i for i, shape in enumerate(SHAPES)}
+WHOT = SHAPE_INDEX['whot']
+
+# Numbers printed on the shape cards (6 and 9 are skipped, as in the
+# official Whot deck) and the number printed on Whot cards
+NUMBERS = tuple(num for num in range(1, 15) if num != 6 and num != 9)
+WHOT_NUMBER = 20
+WHOT_COUNT = 5
+
+# Card encoding
+#
+# Every physical card is a small int: its position in the unshuffled deck.
+# CARD_SHAPE / CARD_NUMBER decode it, and a hand is a bitset over card ids,
+# so matching a hand against the top card is a couple of mask operations.
+CARD_SHAPE = []
+CARD_NUMBER = []
+for _shape in range(WHOT):
+    for _num in NUMBERS:
+        CARD_SHAPE.append(_shape)
+        CARD_NUMBER.append(_num)
+for _ in range(WHOT_COUNT):
+    CARD_SHAPE.append(WHOT)
+    CARD_NUMBER.append(WHOT_NUMBER)
+CARD_SHAPE = tuple(CARD_SHAPE)
+CARD_NUMBER = tuple(CARD_NUMBER)
+DECK_SIZE = len(CARD_SHAPE)
+
+# Bitmasks of every card with a given shape / number
+SHAPE_MASKS = tuple(
+    sum(1 << c for c in range(DECK_SIZE) if CARD_SHAPE[c] == s)
+    for s in range(len(SHAPES)))
+NUMBER_MASKS = {
+    num: sum(1 << c for c in range(DECK_SIZE) if CARD_NUMBER[c] == num)
+    for num in NUMBERS + (WHOT_NUMBER,)}
+WHOT_MASK = SHAPE_MASKS[WHOT]
+FULL_DECK = (1 << DECK_SIZE) - 1
+FULL_SHAPE_COUNTS = tuple(CARD_SHAPE.count(s) for s in range(len(SHAPES)))
+
+MASK64 = (1 << 64) - 1
+
+# Seats
+PLAYER = 0
+COMPUTER = 1
+
+GAME_STATUSES = ('initializing', 'playing', 'whotRequest', 'ended')
+
+
+def encode_card(card):
+    # Lowest card id with the shape and number of a card dict
+    shape = SHAPE_INDEX[card['shape']]
+    mask = SHAPE_MASKS[shape] & NUMBER_MASKS[card['number']]
+    return (mask & -mask).bit_length() - 1
+
+
+def decode_card(card):
+    # Dict view of a card id, as used by the UI
+    return {'shape': SHAPES[CARD_SHAPE[card]], 'number': CARD_NUMBER[card]}
+
+
+def iter_cards(mask):
+    # Card ids set in a bitmask, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def playable_mask(top_card, requested_shape=None):
+    # Mask of every card that may be played on top_card
+    if CARD_SHAPE[top_card] == WHOT and requested_shape is not None:
+        return SHAPE_MASKS[requested_shape] | WHOT_MASK
+    return (SHAPE_MASKS[CARD_SHAPE[top_card]]
+            | NUMBER_MASKS[CARD_NUMBER[top_card]] | WHOT_MASK)
+
+
+class GameRandom:
+    # Small counter-based RNG (SplitMix64) with the parts of the random
+    # module the engine uses. Its stream is simple enough to reproduce with
+    # array operations, which is what lets the batch simulator match
+    # WhotGame game-for-game from the same seed.
+
+    __slots__ = ('state',)
+
+    def __init__(self, seed=0):
+        self.state = seed & MASK64
+
+    def next(self):
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def randrange(self, n):
+        return self.next() % n
+
+    def choice(self, seq):
+        return seq[self.next() % len(seq)]
+
+    def shuffle(self, x):
+        # Fisher-Yates, walking down from the end like random.shuffle
+        for i in range(len(x) - 1, 0, -1):
+            j = self.next() % (i + 1)
+            x[i], x[j] = x[j], x[i]
+
+
+class Hand:
+    # A hand of cards stored as a bitset over card ids, with per-shape and
+    # per-number bucket bitsets and per-shape counts kept up to date on
+    # every add and remove, so move generation and shape choice never
+    # rescan the hand. order keeps the cards in the order they were added,
+    # which is the order the UI shows them in (new cards at the right-hand
+    # end); it is a dict used as an ordered set, so removing a card is O(1).
+
+    __slots__ = ('bits', 'order', 'shape_bits', 'shape_counts', 'number_bits')
+
+    def __init__(self, cards=()):
+        self.bits = 0
+        self.order = {}
+        self.shape_bits = [0] * len(SHAPES)
+        self.shape_counts = [0] * len(SHAPES)
+        self.number_bits = [0] * (WHOT_NUMBER + 1)
+        self.extend(cards)
+
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(iter_cards(bits))
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __contains__(self, card):
+        return bool(self.bits >> card & 1)
+
+    def add(self, card):
+        bit = 1 << card
+        if self.bits & bit:
+            return
+        self.bits |= bit
+        self.order[card] = None
+        shape = CARD_SHAPE[card]
+        number = CARD_NUMBER[card]
+        self.shape_bits[shape] |= bit
+        self.shape_counts[shape] += 1
+        self.number_bits[number] |= bit
+
+    def extend(self, cards):
+        for card in cards:
+            self.add(card)
+
+    def remove(self, card):
+        bit = 1 << card
+        if not self.bits & bit:
+            return
+        self.bits ^= bit
+        del self.order[card]
+        shape = CARD_SHAPE[card]
+        number = CARD_NUMBER[card]
+        self.shape_bits[shape] ^= bit
+        self.shape_counts[shape] -= 1
+        self.number_bits[number] ^= bit
+
+    def card_at(self, index):
+        # Card id at a position of the hand view
+        return next(islice(self.order, index, None))
+
+    def playable(self, mask):
+        return self.bits & mask
+
+    def playable_against(self, top_card, requested_shape=None):
+        # Bitset of the cards that may be played on top_card
+        whots = self.shape_bits[WHOT]
+        if CARD_SHAPE[top_card] == WHOT:
+            if requested_shape is not None:
+                return self.shape_bits[requested_shape] | whots
+            return whots
+        return (self.shape_bits[CARD_SHAPE[top_card]]
+                | self.number_bits[CARD_NUMBER[top_card]] | whots)
+
+    def most_common_shape(self):
+        # Shape index held most often (ties go to the earlier shape), or
+        # None if the hand holds only Whot cards
+        counts = self.shape_counts
+        best = max(range(WHOT), key=counts.__getitem__)
+        return best if counts[best] else None
+
+    def view(self):
+        return [decode_card(card) for card in self.order]
+
+
+def sample_deal(cards, sizes, voids, drawn, rng):
+    # Deal shuffled cards into hands of the given sizes and a market order.
+    # A hand holds no card of its void mask except for up to drawn[i] cards
+    # picked since the void was seen; if too few cards fit, any are used.
+    # Returns (hand bitsets, market list).
+    cards = list(cards)
+    rng.shuffle(cards)
+    hands = []
+    for size, void, count in zip(sizes, voids, drawn):
+        clear = size - min(size, count)
+        hand = 0
+        rest = []
+        for card in cards:
+            if clear and not void >> card & 1:
+                hand |= 1 << card
+                clear -= 1
+            else:
+                rest.append(card)
+        take = size - hand.bit_count()
+        for card in rest[:take]:
+            hand |= 1 << card
+        hands.append(hand)
+        cards = rest[take:]
+    return hands, cards
+
+
+class CardTracker:
+    # What every seat can deduce about the hidden cards, kept up to date by
+    # WhotGame as cards are played, picked and reshuffled. live is a bitset
+    # of every card not on the play pile, with counts per shape, so the
+    # cards a seat cannot see are live minus its own hand and counting them
+    # is two list lookups. voids[seat] is the playable mask the last time
+    # seat had to pick because it could not play, and drawn[seat] the cards
+    # it has picked since, which may fall inside it.
+
+    __slots__ = ('live', 'shape_counts', 'voids', 'drawn')
+
+    def __init__(self, pile=(), num_players=2):
+        self.live = FULL_DECK
+        self.shape_counts = list(FULL_SHAPE_COUNTS)
+        for card in pile:
+            self.played(None, card)
+        self.voids = [0] * num_players
+        self.drawn = [0] * num_players
+
+    def copy(self):
+        tracker = CardTracker.__new__(CardTracker)
+        tracker.live = self.live
+        tracker.shape_counts = self.shape_counts[:]
+        tracker.voids = self.voids[:]
+        tracker.drawn = self.drawn[:]
+        return tracker
+
+    def played(self, seat, card):
+        self.live ^= 1 << card
+        self.shape_counts[CARD_SHAPE[card]] -= 1
+
+    def picked(self, seat, count):
+        self.drawn[seat] += count
+
+    def passed(self, seat, mask):
+        # seat could not play anything in mask. Earlier voids still hold
+        # unless it has picked cards since.
+        self.voids[seat] = mask if self.drawn[seat] else mask | self.voids[seat]
+        self.drawn[seat] = 0
+
+    def refilled(self, cards):
+        for card in cards:
+            self.live |= 1 << card
+            self.shape_counts[CARD_SHAPE[card]] += 1
+
+    def unseen(self, hand):
+        # Bitset of the cards the owner of hand cannot see
+        return self.live & ~hand.bits
+
+    def unseen_shape_count(self, hand, shape):
+        return self.shape_counts[shape] - hand.shape_counts[shape]
+
+    def consistent(self, seat, bits):
+        # Whether seat could be holding the cards in bits
+        return (bits & self.voids[seat]).bit_count() <= self.drawn[seat]
+
+    def sample(self, hand, sizes, rng):
+        # A plausible deal of the cards hidden from the owner of hand:
+        # ({seat: hand bitset} for the seats in sizes, market order)
+        seats = list(sizes)
+        hands, market = sample_deal(
+            iter_cards(self.unseen(hand)), [sizes[seat] for seat in seats],
+            [self.voids[seat] for seat in seats], [self.drawn[seat] for seat in seats], rng)
+        return dict(zip(seats, hands)), market
+
+
+class GameSnapshot(NamedTuple):
+    # Immutable, hashable copy of a game's full state. Hands are card-id
+    # bitsets, one per seat; market is in draw order; pile ends with the
+    # top card.
+    hands: tuple
+    market: tuple
+    pile: tuple
+    requested: int  # shape index, or -1 for no request
+    status: str
+    turn: int
+    reshuffle_market: bool
+    passes: int = 0  # consecutive turns passed with an empty market
+    winner: int = -1  # seat that won, or -1 (also for a stalled game)
+
+    # Fixed layout for a given number of seats: version, flags, status,
+    # turn, requested, passes, winner, seat count, a 9-byte bitset per
+    # hand, market and pile lengths, then the market and pile card ids
+    # packed into 65 bytes (padded with 0xff). 93 bytes for a two-seat game.
+    HEADER = struct.Struct('<8B')
+    TAIL = struct.Struct('<2B%ds' % DECK_SIZE)
+    VERSION = 3
+
+    @property
+    def player(self):
+        return self.hands[PLAYER]
+
+    @property
+    def computer(self):
+        return self.hands[COMPUTER]
+
+    def to_bytes(self):
+        cards = bytes(self.market + self.pile)
+        return b''.join([
+            self.HEADER.pack(self.VERSION, int(self.reshuffle_market),
+                             GAME_STATUSES.index(self.status), self.turn,
+                             self.requested & 0xff, self.passes, self.winner & 0xff,
+                             len(self.hands)),
+            *(hand.to_bytes(9, 'little') for hand in self.hands),
+            self.TAIL.pack(len(self.market), len(self.pile),
+                           cards.ljust(DECK_SIZE, b'\xff'))])
+
+    @classmethod
+    def from_bytes(cls, data):
+        (version, flags, status, turn, requested, passes, winner,
+         seats) = cls.HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f'Unsupported snapshot version {version}')
+        offset = cls.HEADER.size
+        hands = []
+        for _ in range(seats):
+            hands.append(int.from_bytes(data[offset:offset + 9], 'little'))
+            offset += 9
+        market_size, pile_size, cards = cls.TAIL.unpack_from(data, offset)
+        return cls(
+            tuple(hands),
+            tuple(cards[:market_size]),
+            tuple(cards[market_size:market_size + pile_size]),
+            -1 if requested == 0xff else requested,
+            GAME_STATUSES[status], turn, bool(flags & 1), passes,
+            -1 if winner == 0xff else winner)
+
+
+# Pending effects, resolved in order by WhotGame.resolve_effects()
+PICK = 'pick'  # (PICK, seat, count): seat picks count cards from the market
+PLAY_AGAIN = 'play_again'  # (PLAY_AGAIN, seat): seat moves again
+NEXT_TURN = 'next_turn'  # (NEXT_TURN, seat): the seat after seat moves
+REQUEST_SHAPE = 'request_shape'  # (REQUEST_SHAPE, seat, strategy): seat names a shape
+
+# Strategy placeholder for effects decided by the built-in AI policy
+BUILTIN_AI = 'builtin'
+
+# Game state
+
+
+class WhotGame:
+    def __init__(self, reshuffle_market=False, rng=None, computer_strategy=None,
+                 num_players=2):
+        # With reshuffle_market, an empty market is refilled from the play
+        # pile (all but the top card) instead of running dry
+        self.reshuffle_market = reshuffle_market
+        # Any object with shuffle/choice/randrange; the random module by default
+        self.rng = random if rng is None else rng
+        # Object with choose_card(game, hand) and choose_shape(game, hand)
+        # used by computer_play; the built-in random policy by default
+        self.computer_strategy = computer_strategy
+        # Seat 0 is the player; every other seat is a computer
+        self.num_players = num_players
+        self.deck = self.create_deck()
+        self.hands = [Hand() for _ in range(num_players)]
+        self.pile = []
+        self.market = deque()
+        self.game_status = 'initializing'
+        self.message = 'Welcome to Whot!'
+        self.selected_card = None
+        self.requested_shape = None
+        self.turn = PLAYER
+        self.pending = deque()
+        self.passes = 0  # consecutive turns passed with an empty market
+        self.winner = None
+        self.tracker = CardTracker(num_players=num_players)
+        # Optional whot_replay.GameRecorder, told about every move
+        self.recorder = None
+        # Optional whot_endgame.EndgameSolver; computer_play hands it the
+        # move whenever the position is small enough for it to solve
+        self.endgame_solver = None
+        self.initialize_game()
+
+    @property
+    def player_cards(self):
+        return self.hands[PLAYER]
+
+    @property
+    def computer_cards(self):
+        return self.hands[COMPUTER]
+
+    # Dict-based views of the game state, for the UI
+
+    @property
+    def player_hand(self):
+        return self.player_cards.view()
+
+    @property
+    def computer_hand(self):
+        return self.computer_cards.view()
+
+    @property
+    def play_pile(self):
+        return [decode_card(card) for card in self.pile]
+
+    @property
+    def market_pile(self):
+        return [decode_card(card) for card in self.market]
+
+    @property
+    def whot_shape_request(self):
+        if self.requested_shape is None:
+            return None
+        return SHAPES[self.requested_shape]
+
+    @whot_shape_request.setter
+    def whot_shape_request(self, shape):
+        self.requested_shape = None if shape is None else SHAPE_INDEX[shape]
+
+    def create_deck(self):
+        # One id per physical card: 60 numbered cards and 5 Whot cards
+        return list(range(DECK_SIZE))
+
+    def initialize_game(self):
+        # Shuffle deck
+        self.rng.shuffle(self.deck)
+
+        # Deal 7 cards to every seat
+        self.hands = [Hand(self.deck[7 * seat:7 * seat + 7])
+                      for seat in range(self.num_players)]
+
+        # Set market pile (drawn from the left)
+        self.market = deque(self.deck[7 * self.num_players:-1])
+
+        # Set initial card
+        self.pile = [self.deck[-1]]
+        self.tracker = CardTracker(self.pile, self.num_players)
+
+        self.game_status = 'playing'
+        self.turn = PLAYER
+        self.pending.clear()
+        self.passes = 0
+        self.winner = None
+        self.message = 'Your turn! Play a card or pick from market.'
+
+    def seat_name(self, seat):
+        if seat == PLAYER:
+            return 'You'
+        return 'Computer' if self.num_players == 2 else f'Computer {seat}'
+
+    def next_seat(self, seat):
+        return (seat + 1) % self.num_players
+
+    def result_message(self):
+        if self.winner is None:
+            return 'Market is empty and nobody can play. Game over!'
+        if self.winner == PLAYER:
+            return 'You win! 🎉'
+        return f'{self.seat_name(self.winner)} wins! 😢'
+
+    def snapshot(self):
+        return GameSnapshot(
+            tuple(hand.bits for hand in self.hands),
+            tuple(self.market), tuple(self.pile),
+            -1 if self.requested_shape is None else self.requested_shape,
+            self.game_status, self.turn, self.reshuffle_market, self.passes,
+            -1 if self.winner is None else self.winner)
+
+    def restore(self, snapshot):
+        self.num_players = len(snapshot.hands)
+        # Hands come back in card id order; snapshots keep only the bitsets
+        self.hands = [Hand.from_bits(bits) for bits in snapshot.hands]
+        self.market = deque(snapshot.market)
+        self.pile = list(snapshot.pile)
+        # Snapshots leave out what was learned from picks: voids start unknown
+        self.tracker = CardTracker(self.pile, self.num_players)
+        self.requested_shape = None if snapshot.requested < 0 else snapshot.requested
+        self.game_status = snapshot.status
+        self.turn = snapshot.turn
+        self.reshuffle_market = snapshot.reshuffle_market
+        self.selected_card = None
+        self.pending = deque()
+        self.passes = snapshot.passes
+        self.winner = None if snapshot.winner < 0 else snapshot.winner
+
+        # The message is UI text, so rebuild a neutral one for the state
+        if self.game_status == 'ended':
+            self.message = self.result_message()
+        elif self.game_status == 'whotRequest':
+            self.message = 'You played a Whot card! Select a shape to request:'
+        elif self.turn != PLAYER:
+            self.message = f'{self.seat_name(self.turn)}\'s turn...'
+        else:
+            self.message = 'Your turn! Play a card or pick from market.'
+
+    @classmethod
+    def from_snapshot(cls, snapshot, rng=None, computer_strategy=None):
+        # Build a game directly in a snapshot's state, skipping the deal
+        game = cls.__new__(cls)
+        game.rng = random if rng is None else rng
+        game.computer_strategy = computer_strategy
+        game.recorder = None
+        game.endgame_solver = None
+        game.deck = game.create_deck()
+        game.restore(snapshot)
+        return game
+
+    def clone(self, rng=None):
+        game = self.from_snapshot(self.snapshot(), self.rng if rng is None else rng,
+                                  self.computer_strategy)
+        game.message = self.message
+        game.tracker = self.tracker.copy()
+        game.endgame_solver = self.endgame_solver
+        return game
+
+    def top_card(self):
+        return self.pile[-1]
+
+    def playable_mask(self):
+        return playable_mask(self.pile[-1], self.requested_shape)
+
+    def refill_market(self):
+        # Shuffle the play pile, minus its top card, back into the market
+        if not self.reshuffle_market or len(self.pile) < 2:
+            return False
+        cards = self.pile[:-1]
+        del self.pile[:-1]
+        self.rng.shuffle(cards)
+        self.market.extend(cards)
+        self.tracker.refilled(cards)
+        if self.recorder is not None:
+            self.recorder.refill(cards)
+        return True
+
+    def draw_from_market(self, count=1):
+        # Draw up to count cards from the top of the market
+        market = self.market
+        if len(market) < count:
+            self.refill_market()
+            count = min(count, len(market))
+        return [market.popleft() for _ in range(count)]
+
+    def pick_from_market(self):
+        if not self.market and not self.refill_market():
+            # Nothing to pick: the player passes
+            self.pass_turn(PLAYER)
+            if self.recorder is not None:
+                self.recorder.move(None)
+            if self.game_status == 'ended':
+                self.message = self.result_message()
+            else:
+                self.message = f'Market is empty! You pass. {self.seat_name(self.turn)}\'s turn.'
+            return True
+
+        card = self.market.popleft()
+
+        self.player_cards.add(card)
+        self.tracker.picked(PLAYER, 1)
+        self.passes = 0
+        self.turn = self.next_seat(PLAYER)
+        if self.recorder is not None:
+            self.recorder.move(None)
+        self.message = f'You picked from market. {self.seat_name(self.turn)}\'s turn.'
+        return True  # Player picked a card
+
+    def can_play_card(self, card):
+        # Accepts either a card id or a card dict
+        if isinstance(card, dict):
+            card = encode_card(card)
+        return bool(self.playable_mask() >> card & 1)
+
+    def play_card(self, card_index):
+        if not (0 <= card_index < len(self.player_cards)):
+            return False
+
+        card = self.player_cards.card_at(card_index)
+
+        if not self.can_play_card(card):
+            self.message = 'Invalid move! Card must match shape or number'
+            return False
+
+        self.selected_card = None
+        self.place_card(PLAYER, card, None)
+        # A Whot is recorded once its shape has been requested
+        if self.recorder is not None and self.game_status != 'whotRequest':
+            self.recorder.move(card)
+
+        # Check win condition
+        if self.game_status == 'ended':
+            self.message = 'You win! 🎉'
+        elif self.game_status == 'whotRequest':
+            self.message = 'You played a Whot card! Select a shape to request:'
+        elif CARD_NUMBER[card] == 2:
+            # Pick two
+            self.message = f'{self.seat_name(self.next_seat(PLAYER))} picks 2! Your turn again.'
+        elif CARD_NUMBER[card] == 14:
+            # General Market
+            if self.num_players == 2:
+                self.message = 'General Market! Computer picks 1. Your turn again.'
+            else:
+                self.message = 'General Market! Everyone picks 1. Your turn again.'
+        else:
+            self.message = f'{self.seat_name(self.turn)}\'s turn...'
+        return True
+
+    def request_shape(self, shape):
+        self.whot_shape_request = shape
+        self.game_status = 'playing'
+        self.turn = self.next_seat(PLAYER)
+        if self.recorder is not None:
+            self.recorder.move(self.pile[-1], self.requested_shape)
+        self.message = f'You requested {shape}. {self.seat_name(self.turn)}\'s turn...'
+        return True
+
+    def pick_cards_from_market(self, count, player):
+        # player is a seat number, or 'player' / 'computer'
+        if player == 'player':
+            player = PLAYER
+        elif player == 'computer':
+            player = COMPUTER
+        drawn = self.draw_from_market(count)
+        self.hands[player].extend(drawn)
+        self.tracker.picked(player, len(drawn))
+
+    def place_card(self, seat, card, strategy):
+        # Move card from seat's hand to the play pile, queue its effects and
+        # resolve them. strategy decides a Whot request for computer seats;
+        # None means the player will answer through request_shape().
+        hand = self.hands[seat]
+        hand.remove(card)
+        self.pile.append(card)
+        self.tracker.played(seat, card)
+        self.passes = 0
+
+        # Check win condition
+        if not hand:
+            self.game_status = 'ended'
+            self.winner = seat
+            self.pending.clear()
+            return
+
+        # Handle special cards
+        pending = self.pending
+        if CARD_SHAPE[card] == WHOT:
+            pending.append((REQUEST_SHAPE, seat, strategy))
+        elif CARD_NUMBER[card] == 2:
+            # Pick two: the next seat picks 2, then play again
+            pending.append((PICK, self.next_seat(seat), 2))
+            pending.append((PLAY_AGAIN, seat))
+        elif CARD_NUMBER[card] == 14:
+            # General Market: every other seat picks 1, then play again
+            other = self.next_seat(seat)
+            while other != seat:
+                pending.append((PICK, other, 1))
+                other = self.next_seat(other)
+            pending.append((PLAY_AGAIN, seat))
+        else:
+            pending.append((NEXT_TURN, seat))
+        self.resolve_effects()
+
+    def resolve_effects(self):
+        # Apply queued effects in order. Stops early only when the player
+        # has to choose a Whot shape.
+        pending = self.pending
+        while pending:
+            effect = pending.popleft()
+            kind = effect[0]
+            if kind == PICK:
+                drawn = self.draw_from_market(effect[2])
+                self.hands[effect[1]].extend(drawn)
+                self.tracker.picked(effect[1], len(drawn))
+            elif kind == PLAY_AGAIN:
+                self.turn = effect[1]
+            elif kind == NEXT_TURN:
+                self.turn = self.next_seat(effect[1])
+            elif kind == REQUEST_SHAPE:
+                seat, strategy = effect[1], effect[2]
+                if strategy is None:
+                    self.turn = seat
+                    self.game_status = 'whotRequest'
+                    return
+                hand = self.hands[seat]
+                if strategy is BUILTIN_AI:
+                    self.requested_shape = self.choose_shape(hand)
+                else:
+                    self.requested_shape = strategy.choose_shape(self, hand)
+                self.turn = self.next_seat(seat)
+
+    def choose_card(self, hand):
+        # AI policy: a random playable card from hand, or None
+        playable = hand.playable_against(self.pile[-1], self.requested_shape)
+        if not playable:
+            return None
+        return self.rng.choice(list(iter_cards(playable)))
+
+    def choose_shape(self, hand):
+        # AI policy: request the most common shape left in hand
+        most_common = hand.most_common_shape()
+        if most_common is not None:
+            return most_common
+        # If only whot cards left, choose a random shape
+        return self.rng.randrange(WHOT)
+
+    def pass_turn(self, seat):
+        # seat could not pick from an empty market. Once every seat has
+        # passed in a row nobody can play, and the game ends without a winner.
+        self.passes += 1
+        self.turn = self.next_seat(seat)
+        if self.passes >= self.num_players:
+            self.game_status = 'ended'
+            self.winner = None
+
+    def ai_turn(self, strategy=None):
+        # Take one action for the seat whose turn it is: play a card chosen
+        # by strategy (computer_strategy, or the built-in policy, when None;
+        # endgame_solver instead once it applies) or pick from the market.
+        # Returns the card played, or None.
+        seat = self.turn
+        hand = self.hands[seat]
+        if strategy is None:
+            strategy = self.computer_strategy or BUILTIN_AI
+            if self.endgame_solver is not None and self.endgame_solver.applies(self):
+                strategy = self.endgame_solver
+        if strategy is BUILTIN_AI:
+            card = self.choose_card(hand)
+        else:
+            card = strategy.choose_card(self, hand)
+
+        # If no playable cards, pick from market
+        if card is None:
+            # Every computer policy picks only when it cannot play, so the
+            # other seats learn that the hand holds nothing playable
+            mask = self.playable_mask()
+            if not hand.playable(mask):
+                self.tracker.passed(seat, mask)
+            drawn = self.draw_from_market(1)
+            if drawn:
+                hand.add(drawn[0])
+                self.tracker.picked(seat, 1)
+                self.passes = 0
+                self.turn = self.next_seat(seat)
+            else:
+                self.pass_turn(seat)
+            if self.recorder is not None:
+                self.recorder.move(None)
+            return None
+
+        self.place_card(seat, card, strategy)
+        if self.recorder is not None:
+            self.recorder.move(card, self.requested_shape)
+        return card
+
+    def computer_step(self, strategy=None):
+        # One computer action for the current seat, with its message.
+        # Returns the card played, or None if it picked or passed.
+        seat = self.turn
+        name = self.seat_name(seat)
+        passes = self.passes
+        card = self.ai_turn(strategy)
+
+        if self.game_status == 'ended':
+            self.message = self.result_message()
+            return card
+        if card is None:
+            if self.passes > passes:
+                self.message = 'Market is empty!'
+            else:
+                self.message = f'{name} picked from market.'
+        elif CARD_SHAPE[card] == WHOT:
+            self.message = f'{name} played a Whot and requests {self.whot_shape_request}.'
+        else:
+            self.message = f'{name} played a card.'
+        if self.turn == PLAYER:
+            self.message += ' Your turn!'
+        return card
+
+    def computer_play(self):
+        # Computer seats move until it's the player's turn or the game ends;
+        # 2s and 14s simply leave the turn with the same seat
+        while self.game_status == 'playing' and self.turn != PLAYER:
+            self.computer_step()
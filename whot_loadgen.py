@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from whot_engine import playable_mask
+
+# Headless client and load generator for whot_server
+#
+# Client keeps the merged state of every table it sits at by applying the
+# server's state diffs. The load generator opens --connections clients,
+# each keeping --tables games going in seat 0 against a computer seat and
+# answering every turn at once with the built-in random policy. It reports
+# moves and games per second and the latency from sending a move to
+# receiving the table update that shows it.
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.tables = {}  # table id -> merged state
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def send(self, op, **fields):
+        fields['op'] = op
+        self.writer.write(json.dumps(fields, separators=(',', ':')).encode() + b'\n')
+
+    async def receive(self):
+        # Next message from the server, or None once it hangs up. State
+        # diffs are merged into self.tables before they are returned.
+        line = await self.reader.readline()
+        if not line:
+            return None
+        message = json.loads(line)
+        if message['type'] == 'state':
+            self.tables.setdefault(message['table'], {}).update(message)
+        return message
+
+    def close(self):
+        self.writer.close()
+
+
+def choose_move(state, rng):
+    # The built-in policy on a client's view of a table: a random playable
+    # card, or None to pick from the market. The server picks the shape
+    # for a Whot played without one.
+    requested = state['requested']
+    mask = playable_mask(state['top'], None if requested < 0 else requested)
+    playable = [card for card in state['hand'] if mask >> card & 1]
+    return rng.choice(playable) if playable else None
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def play_tables(args, stats, seed):
+    # One connection keeping args.tables games going until cancelled
+    rng = random.Random(seed)
+    client = await Client.connect(args.host, args.port, args.unix)
+    sent = {}  # table id -> (time the move was sent, moves before it)
+
+    def new_table():
+        client.send('new', seats=['human', args.opponent], join=0,
+                    seed=rng.randrange(1 << 63))
+
+    try:
+        for _ in range(args.tables):
+            new_table()
+        while True:
+            message = await client.receive()
+            if message is None:
+                return
+            if message['type'] == 'error':
+                stats['errors'] += 1
+                continue
+            if message['type'] != 'state':
+                continue
+
+            table = message['table']
+            state = client.tables[table]
+            if table in sent and state['moves'] > sent[table][1]:
+                stats['latency'].append(time.perf_counter() - sent.pop(table)[0])
+            if state['status'] == 'ended':
+                stats['games'] += 1
+                client.send('leave', table=table)
+                del client.tables[table]
+                sent.pop(table, None)
+                new_table()
+            elif state['turn'] == 0 and table not in sent:
+                card = choose_move(state, rng)
+                if card is None:
+                    client.send('pick', table=table)
+                else:
+                    client.send('play', table=table, card=card)
+                sent[table] = (time.perf_counter(), state['moves'])
+                stats['moves'] += 1
+    finally:
+        client.close()
+
+
+async def wait_for_server(args, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            client = await Client.connect(args.host, args.port, args.unix)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            client.close()
+            return
+
+
+async def run(args):
+    stats = {'moves': 0, 'games': 0, 'errors': 0, 'latency': []}
+    await wait_for_server(args)
+    tasks = [asyncio.create_task(play_tables(args, stats, args.seed + i))
+             for i in range(args.connections)]
+    start = time.perf_counter()
+    done, _ = await asyncio.wait(tasks, timeout=args.duration)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    for task in done:
+        task.result()  # surface connection errors
+    return stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator for whot_server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='connect to this Unix socket path instead')
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument('--tables', type=int, default=100,
+                        help='concurrent tables per connection')
+    parser.add_argument('--opponent', choices=['random', 'greedy'], default='random')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', action='store_true',
+                        help='start a local server for the run')
+    parser.add_argument('--ai-delay', type=float, default=0.0,
+                        help='computer move delay for a spawned server')
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                'whot_server.py'),
+                   '--ai-delay', str(args.ai_delay)]
+        if args.unix:
+            command += ['--unix', args.unix]
+        else:
+            command += ['--host', args.host, '--port', str(args.port)]
+        server = subprocess.Popen(command)
+    try:
+        stats, elapsed = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latency = stats['latency']
+    print(f'{args.connections * args.tables} tables over {args.connections} connections, '
+          f'{elapsed:.1f}s')
+    print(f'  moves/s:  {stats["moves"] / elapsed:,.0f}')
+    print(f'  games/s:  {stats["games"] / elapsed:,.1f}')
+    print(f'  errors:   {stats["errors"]}')
+    print('  latency:  ' + '  '.join(
+        f'{label} {percentile(latency, q) * 1000:.1f}ms'
+        for label, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))))
+
+
+if __name__ == '__main__':
+    main()
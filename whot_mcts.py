@@ -0,0 +1,328 @@
+import argparse
+import math
+import os
+import random
+import time
+from multiprocessing import Event, Pool
+
+from whot_engine import (
+    CARD_NUMBER, CARD_SHAPE, COMPUTER, DECK_SIZE, PLAYER, SHAPE_MASKS, WHOT, WHOT_MASK,
+    GameRandom, WhotGame, iter_cards, playable_mask, sample_deal)
+
+# Information-set Monte Carlo tree search
+#
+# The searching player knows its own hand, the play pile, how many cards
+# the opponent holds and which cards it could not play when it last picked
+# (see CardTracker). Each iteration deals the unseen cards into a plausible
+# opponent hand and market order (a determinization), walks one shared
+# tree restricted to the moves legal in that deal (SO-ISMCTS), then plays
+# the game out at random. Root statistics from several worker processes
+# are summed before the move is picked (root parallelism).
+
+# A move is card * 8 + shape; shape is the requested shape for a Whot and
+# NO_SHAPE otherwise. DRAW picks from the market (or passes when it is empty).
+NO_SHAPE = 7
+DRAW = -1
+NO_REQUEST = WHOT
+MAX_PLAYOUT_TURNS = 300
+# How often a pooled search checks whether it has been asked to stop (s)
+STOP_POLL = 0.005
+
+# PLAYABLE[top][requested] is the playable mask for a play pile top
+PLAYABLE = [[playable_mask(top, None if req == NO_REQUEST else req)
+             for req in range(WHOT + 1)]
+            for top in range(DECK_SIZE)]
+
+
+def move_card(move):
+    return move >> 3
+
+
+def move_shape(move):
+    shape = move & 7
+    return None if shape == NO_SHAPE else shape
+
+
+def legal_moves(hand, top, requested):
+    # Moves for a hand on top (with requested, or NO_REQUEST). Picking is
+    # only offered when nothing can be played.
+    playable = hand & PLAYABLE[top][requested]
+    if not playable:
+        return [DRAW]
+    moves = [card << 3 | NO_SHAPE for card in iter_cards(playable & ~WHOT_MASK)]
+    whots = playable & WHOT_MASK
+    if whots:
+        # Whot cards are interchangeable, so only offer the lowest one
+        card = (whots & -whots).bit_length() - 1
+        moves.extend(card << 3 | shape for shape in range(WHOT))
+    return moves
+
+
+class SearchState:
+    # Minimal two-seat game state for playouts; cheap to copy
+
+    __slots__ = ('hands', 'market', 'top', 'requested', 'seat', 'passes', 'winner')
+
+    def __init__(self, hands, market, top, requested, seat):
+        self.hands = hands
+        self.market = market  # next card to draw is at the end
+        self.top = top
+        self.requested = requested
+        self.seat = seat
+        self.passes = 0
+        self.winner = None  # seat that won, or -1 for a stalled game
+
+    def moves(self):
+        return legal_moves(self.hands[self.seat], self.top, self.requested)
+
+    def draw(self, seat, count):
+        market = self.market
+        for _ in range(min(count, len(market))):
+            self.hands[seat] |= 1 << market.pop()
+
+    def play(self, move):
+        seat = self.seat
+        if move == DRAW:
+            if self.market:
+                self.draw(seat, 1)
+                self.passes = 0
+            else:
+                self.passes += 1
+                if self.passes >= 2:
+                    self.winner = -1
+            self.seat = 1 - seat
+            return
+
+        card = move >> 3
+        self.hands[seat] &= ~(1 << card)
+        self.top = card
+        self.passes = 0
+        if not self.hands[seat]:
+            self.winner = seat
+            return
+        if CARD_SHAPE[card] == WHOT:
+            self.requested = move & 7
+            self.seat = 1 - seat
+            return
+        number = CARD_NUMBER[card]
+        if number == 2:
+            self.draw(1 - seat, 2)
+        elif number == 14:
+            self.draw(1 - seat, 1)
+        else:
+            self.seat = 1 - seat
+
+    def playout(self, rng):
+        # Finish the game with the computer_play policy
+        turns = 0
+        while self.winner is None and turns < MAX_PLAYOUT_TURNS:
+            turns += 1
+            hand = self.hands[self.seat]
+            playable = hand & PLAYABLE[self.top][self.requested]
+            if not playable:
+                self.play(DRAW)
+                continue
+            k = rng.randrange(playable.bit_count())
+            for card in iter_cards(playable):
+                if not k:
+                    break
+                k -= 1
+            shape = NO_SHAPE
+            if CARD_SHAPE[card] == WHOT:
+                rest = hand & ~(1 << card)
+                counts = [(rest & SHAPE_MASKS[s]).bit_count() for s in range(WHOT)]
+                shape = max(range(WHOT), key=counts.__getitem__)
+            self.play(card << 3 | shape)
+        return self.winner
+
+
+class Node:
+    __slots__ = ('mover', 'visits', 'wins', 'avail', 'children')
+
+    def __init__(self, mover):
+        self.mover = mover  # seat that made the move leading here
+        self.visits = 0
+        self.wins = 0.0
+        self.avail = 0
+        self.children = {}
+
+
+def observe(game, hand):
+    # Everything the owner of hand may know about the game, as a plain
+    # picklable tuple: (own hand, pile top, requested shape, unseen cards,
+    # opponent hand size, opponent void, cards the opponent picked since)
+    opponent = PLAYER if hand is game.computer_cards else COMPUTER
+    tracker = game.tracker
+    requested = NO_REQUEST if game.requested_shape is None else game.requested_shape
+    return (hand.bits, game.pile[-1], requested, tracker.unseen(hand),
+            len(game.hands[opponent]), tracker.voids[opponent], tracker.drawn[opponent])
+
+
+def determinize(info, rng):
+    # Deal the unseen cards into an opponent hand and a market order
+    own, top, requested, unseen, opponent_size, void, drawn = info
+    (opponent,), market = sample_deal(iter_cards(unseen), (opponent_size,), (void,),
+                                      (drawn,), rng)
+    return SearchState([own, opponent], market, top, requested, 0)
+
+
+def search(info, time_budget=None, max_iterations=None, seed=None, exploration=0.7,
+           stop=None):
+    # Run ISMCTS from the root described by info (seat 0 to move) and
+    # return {move: (visits, wins)} for the root's children. Setting the
+    # optional stop event ends the search early with the statistics so far.
+    rng = random.Random(seed)
+    root = Node(None)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    iterations = 0
+
+    while max_iterations is None or iterations < max_iterations:
+        if iterations % 16 == 0:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if stop is not None and iterations and stop.is_set():
+                break
+        iterations += 1
+        state = determinize(info, rng)
+        node = root
+        path = [root]
+
+        # Selection and expansion, restricted to moves legal in this deal
+        while state.winner is None:
+            moves = state.moves()
+            untried = [move for move in moves if move not in node.children]
+            if untried:
+                move = rng.choice(untried)
+                child = node.children[move] = Node(state.seat)
+                for other in moves:
+                    if other in node.children:
+                        node.children[other].avail += 1
+                state.play(move)
+                path.append(child)
+                break
+
+            best = None
+            best_score = -1.0
+            for move in moves:
+                child = node.children[move]
+                child.avail += 1
+                score = (child.wins / child.visits
+                         + exploration * math.sqrt(math.log(child.avail) / child.visits))
+                if score > best_score:
+                    best, best_score = move, score
+            state.play(best)
+            node = node.children[best]
+            path.append(node)
+
+        # Playout and backpropagation
+        winner = state.playout(rng) if state.winner is None else state.winner
+        for node in path:
+            node.visits += 1
+            if winner == node.mover:
+                node.wins += 1.0
+            elif winner == -1 or winner is None:
+                node.wins += 0.5
+
+    return {move: (child.visits, child.wins) for move, child in root.children.items()}
+
+
+# Stop event shared with the pool processes; see ISMCTSStrategy
+_pool_stop = None
+
+
+def _init_worker(stop):
+    global _pool_stop
+    _pool_stop = stop
+
+
+def _search_worker(args):
+    return search(*args, stop=_pool_stop)
+
+
+class ISMCTSStrategy:
+    # Strategy for WhotGame.computer_strategy and the tournament runner.
+    # Searches for time_budget seconds and/or max_iterations iterations per
+    # worker; workers > 1 runs independent searches in a process pool.
+    # Search seeds are drawn from the game's rng, so seeded games replay
+    # identically. The search also ends as soon as stop_event (see
+    # whot_worker.AIWorker) is set; pool workers are told through a
+    # process-shared event and return their root statistics so far.
+
+    def __init__(self, time_budget=0.5, max_iterations=None, workers=1):
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.workers = workers
+        self.pool = None
+        self.pool_stop = None
+        self.pending_shape = None
+        self.stop_event = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def best_move(self, game, hand):
+        info = observe(game, hand)
+        seeds = [game.rng.randrange(1 << 63) for _ in range(self.workers)]
+        if self.workers > 1:
+            if self.pool is None:
+                self.pool_stop = Event()
+                self.pool = Pool(self.workers, _init_worker, (self.pool_stop,))
+            self.pool_stop.clear()
+            pending = self.pool.map_async(_search_worker, [
+                (info, self.time_budget, self.max_iterations, seed) for seed in seeds])
+            if self.stop_event is not None:
+                while not pending.ready():
+                    pending.wait(STOP_POLL)
+                    if self.stop_event.is_set():
+                        self.pool_stop.set()
+                        break
+            results = pending.get()
+        else:
+            results = [search(info, self.time_budget, self.max_iterations, seeds[0],
+                              stop=self.stop_event)]
+
+        # Root parallelism: sum visits across workers, most visited wins
+        visits = {}
+        for result in results:
+            for move, (count, _) in result.items():
+                visits[move] = visits.get(move, 0) + count
+        return max(visits, key=visits.get)
+
+    def choose_card(self, game, hand):
+        self.pending_shape = None
+        if not hand.playable(game.playable_mask()):
+            return None
+        move = self.best_move(game, hand)
+        if move == DRAW:
+            return None
+        self.pending_shape = move_shape(move)
+        return move_card(move)
+
+    def choose_shape(self, game, hand):
+        if self.pending_shape is not None:
+            return self.pending_shape
+        return game.choose_shape(hand)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time ISMCTS moves')
+    parser.add_argument('--time-budget', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    game = WhotGame(rng=GameRandom(args.seed))
+    info = observe(game, game.computer_cards)
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(_search_worker, [
+            (info, args.time_budget, None, args.seed + i) for i in range(args.workers)])
+    elapsed = time.perf_counter() - start
+    iterations = sum(visits for result in results for visits, _ in result.values())
+    print(f'{iterations} playouts in {elapsed:.2f}s over {args.workers} workers')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import functools
+import json
+import time
+from collections import defaultdict, deque
+
+# Frame and engine-call profiler
+#
+# Off by default; while disabled every hook is a single attribute check. A
+# frame is split into consecutive phases (phase() ends the previous one),
+# and spans can be nested inside them: region draws in RegionRenderer and
+# instrumented engine methods. The last `history` durations of each span
+# name are kept for percentiles (the FPS overlay and report()), and every
+# span is also kept as a Chrome trace event, up to max_events, for
+# save_trace(). Open the trace in chrome://tracing or Perfetto.
+
+perf_counter = time.perf_counter
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'cat', 'start')
+
+    def __init__(self, profiler, name, cat):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.cat, self.start, perf_counter())
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    def __init__(self, enabled=False, history=300, max_events=500_000):
+        self.enabled = enabled
+        self.history = history
+        self.max_events = max_events
+        self.origin = perf_counter()
+        self.durations = defaultdict(lambda: deque(maxlen=history))
+        self.frame_ends = deque(maxlen=history)
+        self.events = []
+        self.frame_start = None
+        self.phase_name = None
+        self.phase_start = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_start = None
+        self.phase_name = None
+
+    def add(self, name, cat, start, end):
+        self.durations[name].append(end - start)
+        if len(self.events) < self.max_events:
+            self.events.append({'name': name, 'cat': cat, 'ph': 'X', 'pid': 1, 'tid': 1,
+                                'ts': (start - self.origin) * 1e6,
+                                'dur': (end - start) * 1e6})
+
+    def span(self, name, cat='frame'):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat)
+
+    def begin_frame(self, phase='events'):
+        if not self.enabled:
+            return
+        self.frame_start = self.phase_start = perf_counter()
+        self.phase_name = phase
+
+    def phase(self, name):
+        # End the current phase of the frame and start the next one
+        if self.phase_name is None:
+            return
+        now = perf_counter()
+        self.add(self.phase_name, 'frame', self.phase_start, now)
+        self.phase_name = name
+        self.phase_start = now
+
+    def end_frame(self):
+        if self.phase_name is None:
+            return
+        now = perf_counter()
+        self.add(self.phase_name, 'frame', self.phase_start, now)
+        self.add('frame', 'frame', self.frame_start, now)
+        self.frame_ends.append(now)
+        self.phase_name = None
+
+    def timed(self, fn, name, cat='engine'):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, cat, start, perf_counter())
+        return wrapper
+
+    def instrument(self, obj, names, cat='engine'):
+        # Time calls to the named methods of one object
+        for name in names:
+            setattr(obj, name, self.timed(getattr(obj, name), name, cat))
+
+    def percentile(self, name, q):
+        values = sorted(self.durations.get(name, ()))
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def fps(self):
+        ends = self.frame_ends
+        if len(ends) < 2 or ends[-1] == ends[0]:
+            return 0.0
+        return (len(ends) - 1) / (ends[-1] - ends[0])
+
+    def overlay_text(self):
+        frames = self.durations.get('frame')
+        if not frames:
+            return 'profiling...'
+        mean = sum(frames) / len(frames)
+        return (f'{self.fps():.0f} fps  {mean * 1000:.1f} ms  '
+                f'p95 {self.percentile("frame", 0.95) * 1000:.1f} ms')
+
+    def report(self):
+        # Rolling statistics per span name, slowest first
+        lines = [f'{"span":<24}{"count":>7}{"mean ms":>10}{"p95 ms":>10}{"max ms":>10}']
+        rows = sorted(self.durations.items(), key=lambda item: -sum(item[1]) / len(item[1]))
+        for name, values in rows:
+            lines.append(f'{name:<24}{len(values):>7}{sum(values) / len(values) * 1000:>10.3f}'
+                         f'{self.percentile(name, 0.95) * 1000:>10.3f}'
+                         f'{max(values) * 1000:>10.3f}')
+        return '\n'.join(lines)
+
+    def save_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
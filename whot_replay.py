@@ -0,0 +1,387 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import time
+from bisect import bisect_right
+from collections import deque
+
+from whot_engine import (
+    CARD_SHAPE, DECK_SIZE, WHOT, GameRandom, GameSnapshot, WhotGame, decode_card)
+from whot_worker import FixedMove
+
+# Replay log
+#
+# Games are appended to a byte stream. A game starts with a GAME record
+# (seed, options and the dealt deck) and then takes one byte per move: the
+# card id of a numbered card, WHOT_MOVES + whot * 5 + shape for a Whot and
+# its requested shape, or PICK_MOVE for a pick (or a pass when the market
+# is empty). Market refills are logged as the order the play pile was
+# shuffled back in, so a replay never needs the game's RNG. Every
+# snapshot_every moves a SNAPSHOT record stores the full GameSnapshot, so
+# seeking replays at most that many moves. An END record closes the game.
+#
+# Record tags are >= 0xF0 and move bytes are below, so game boundaries are
+# found with a C-level byte search straight over a memory map.
+
+MAGIC = b'WHOTLOG2'
+WHOT_MOVES = 60  # 60..84: a Whot card with its requested shape
+PICK_MOVE = 0xEF
+GAME, REFILL, SNAPSHOT, END = 0xF0, 0xF1, 0xF2, 0xF3
+
+GAME_RECORD = struct.Struct('<BQBB%ds' % DECK_SIZE)  # tag, seed, flags, seats, deck
+SNAPSHOT_HEAD = struct.Struct('<BI')  # tag, moves so far
+END_RECORD = struct.Struct('<Bb')  # tag, winner (-1 for a stalled game)
+RESHUFFLE_FLAG = 1
+SEEDED_FLAG = 2
+
+_TAG = re.compile(rb'[\xf0-\xff]')
+
+
+def encode_move(card, shape=None):
+    if card is None:
+        return PICK_MOVE
+    if CARD_SHAPE[card] != WHOT:
+        return card
+    return WHOT_MOVES + (card - WHOT_MOVES) * WHOT + (shape or 0)
+
+
+def decode_move(move):
+    # (card, shape) for a move byte; card is None for a pick
+    if move == PICK_MOVE:
+        return None, None
+    if move < WHOT_MOVES:
+        return move, None
+    whot, shape = divmod(move - WHOT_MOVES, WHOT)
+    return WHOT_MOVES + whot, shape
+
+
+def snapshot_size(seats):
+    return GameSnapshot.HEADER.size + 9 * seats + GameSnapshot.TAIL.size
+
+
+class GameRecorder:
+    # Logs one game's moves as the engine reports them (game.recorder).
+    # Bytes are kept per game and handed to the writer when the game ends,
+    # so games played side by side never interleave in the file.
+
+    def __init__(self, writer, game, seed=None, snapshot_every=32):
+        # Attach right after the deal: game.deck is the order it was dealt in
+        self.writer = writer
+        self.game = game
+        self.snapshot_every = snapshot_every
+        self.moves = 0
+        flags = (RESHUFFLE_FLAG if game.reshuffle_market else 0) | (
+            0 if seed is None else SEEDED_FLAG)
+        self.buffer = bytearray(GAME_RECORD.pack(
+            GAME, seed or 0, flags, game.num_players, bytes(game.deck)))
+        game.recorder = self
+
+    def move(self, card, shape=None):
+        game = self.game
+        self.buffer.append(encode_move(card, shape))
+        self.moves += 1
+        if game.game_status == 'ended':
+            self.end(game.winner)
+        elif self.moves % self.snapshot_every == 0:
+            self.buffer += SNAPSHOT_HEAD.pack(SNAPSHOT, self.moves)
+            self.buffer += game.snapshot().to_bytes()
+
+    def refill(self, cards):
+        self.buffer += bytes((REFILL, len(cards)))
+        self.buffer += bytes(cards)
+
+    def end(self, winner=None):
+        # Close the game; call it directly for a game abandoned midway
+        if self.game.recorder is not self:
+            return
+        self.game.recorder = None
+        self.buffer += END_RECORD.pack(END, -1 if winner is None else winner)
+        self.writer.write(self.buffer)
+
+
+class ReplayWriter:
+    # Appends games to a log file, writing in blocks of about buffer_size
+
+    def __init__(self, path, snapshot_every=32, buffer_size=1 << 16):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.snapshot_every = snapshot_every
+        self.buffer_size = buffer_size
+        self.pending = bytearray()
+
+    def record(self, game, seed=None):
+        return GameRecorder(self, game, seed, self.snapshot_every)
+
+    def write(self, data):
+        self.pending += data
+        if len(self.pending) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.pending)
+        self.pending.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LoggedShuffles:
+    # Stand-in RNG for replays: each shuffle puts the cards in the next
+    # logged refill order
+    def __init__(self):
+        self.orders = deque()
+
+    def shuffle(self, cards):
+        cards[:] = self.orders.popleft()
+
+
+class GameReplay:
+    # One logged game, parsed from a buffer (bytes or mmap) at offset
+
+    def __init__(self, data, offset):
+        tag, seed, flags, seats, deck = GAME_RECORD.unpack_from(data, offset)
+        if tag != GAME:
+            raise ValueError(f'No game record at offset {offset}')
+        self.seed = seed if flags & SEEDED_FLAG else None
+        self.reshuffle_market = bool(flags & RESHUFFLE_FLAG)
+        self.num_players = seats
+        self.deck = list(deck)
+        self.winner = None
+        self.ended = False
+
+        moves = bytearray()
+        self.refills = {}  # move index -> refill orders logged during that move
+        self.snapshots = []  # (moves so far, GameSnapshot bytes)
+        size = snapshot_size(seats)
+        pos = offset + GAME_RECORD.size
+        end = len(data)
+        while pos < end:
+            match = _TAG.search(data, pos)
+            stop = end if match is None else match.start()
+            moves += data[pos:stop]
+            pos = stop
+            if pos == end:
+                break
+            tag = data[pos]
+            if tag == REFILL:
+                count = data[pos + 1]
+                self.refills.setdefault(len(moves), []).append(
+                    list(data[pos + 2:pos + 2 + count]))
+                pos += 2 + count
+            elif tag == SNAPSHOT:
+                _, index = SNAPSHOT_HEAD.unpack_from(data, pos)
+                pos += SNAPSHOT_HEAD.size
+                self.snapshots.append((index, bytes(data[pos:pos + size])))
+                pos += size
+            elif tag == END:
+                winner = END_RECORD.unpack_from(data, pos)[1]
+                self.winner = None if winner < 0 else winner
+                self.ended = True
+                pos += END_RECORD.size
+                break
+            else:
+                break  # the next game: this one was cut off
+        self.moves = bytes(moves)
+        self.snapshot_moves = [index for index, _ in self.snapshots]
+        self.size = pos - offset
+
+    def __len__(self):
+        return len(self.moves)
+
+    def initial(self):
+        # The game as dealt
+        n = self.num_players
+        deck = self.deck
+        hands = []
+        for seat in range(n):
+            bits = 0
+            for card in deck[7 * seat:7 * seat + 7]:
+                bits |= 1 << card
+            hands.append(bits)
+        snapshot = GameSnapshot(tuple(hands), tuple(deck[7 * n:-1]), (deck[-1],), -1,
+                                'playing', 0, self.reshuffle_market)
+        game = WhotGame.from_snapshot(snapshot, rng=LoggedShuffles())
+        game.deck = list(deck)
+        return game
+
+    def position(self, move):
+        # The game after its first `move` moves, restored from the latest
+        # snapshot at or before it
+        move = min(move, len(self.moves))
+        i = bisect_right(self.snapshot_moves, move) - 1
+        if i < 0:
+            game = self.initial()
+            start = 0
+        else:
+            start, data = self.snapshots[i]
+            game = WhotGame.from_snapshot(GameSnapshot.from_bytes(data), rng=LoggedShuffles())
+        for index in range(start, move):
+            self.apply(game, index)
+        return game
+
+    def apply(self, game, index):
+        # Re-play move number index on game
+        game.rng.orders.extend(self.refills.get(index, ()))
+        card, shape = decode_move(self.moves[index])
+        game.ai_turn(FixedMove(card, shape))
+
+
+class ReplayLog:
+    # Memory-mapped, read-only view of a log file
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a Whot replay log')
+        self._offsets = None
+
+    @property
+    def offsets(self):
+        # Offset of every game, found with one scan of the file
+        if self._offsets is None:
+            self._offsets = list(scan_games(self.data))
+        return self._offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return GameReplay(self.data, self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield GameReplay(self.data, offset)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scan_games(data):
+    # Yield the offset of each GAME record, skipping over record payloads
+    pos = len(MAGIC)
+    seats = 2
+    end = len(data)
+    while True:
+        match = _TAG.search(data, pos)
+        if match is None:
+            return
+        pos = match.start()
+        tag = data[pos]
+        if tag == GAME:
+            yield pos
+            seats = data[pos + 10]
+            pos += GAME_RECORD.size
+        elif tag == REFILL:
+            pos += 2 + data[pos + 1]
+        elif tag == SNAPSHOT:
+            pos += SNAPSHOT_HEAD.size + snapshot_size(seats)
+        elif tag == END:
+            pos += END_RECORD.size
+        else:
+            raise ValueError(f'Corrupt replay log at offset {pos}')
+        if pos >= end:
+            return
+
+
+def record_games(path, games, seed=0, reshuffle_market=False, snapshot_every=32,
+                 max_turns=1000):
+    # Log self-play games between two built-in policies
+    with ReplayWriter(path, snapshot_every) as writer:
+        for index in range(games):
+            game_seed = seed + index
+            game = WhotGame(reshuffle_market, rng=GameRandom(game_seed))
+            recorder = writer.record(game, game_seed)
+            for _ in range(max_turns):
+                if game.recorder is None:
+                    break
+                game.ai_turn()
+            recorder.end()
+
+
+def verify(log):
+    # Re-simulate every game from its deal and check each snapshot and
+    # the result against the log. Returns the number of mismatches.
+    mismatches = 0
+    for replay in log:
+        game = replay.initial()
+        snapshots = dict(replay.snapshots)
+        ok = True
+        for index in range(len(replay)):
+            replay.apply(game, index)
+            if index + 1 in snapshots:
+                ok = ok and game.snapshot().to_bytes() == snapshots[index + 1]
+        if replay.ended and game.winner != replay.winner:
+            ok = False
+        mismatches += not ok
+    return mismatches
+
+
+def describe(game):
+    lines = [f'status {game.game_status}, turn {game.seat_name(game.turn)}, '
+             f'market {len(game.market)}, top {decode_card(game.top_card())}']
+    if game.whot_shape_request:
+        lines.append(f'requested {game.whot_shape_request}')
+    for seat, hand in enumerate(game.hands):
+        cards = ' '.join(f'{card["shape"][:2]}{card["number"]}' for card in hand.view())
+        lines.append(f'{game.seat_name(seat)}: {cards}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whot replay log tool')
+    parser.add_argument('log')
+    parser.add_argument('--record', type=int, metavar='GAMES',
+                        help='append GAMES self-play games to the log')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reshuffle', action='store_true')
+    parser.add_argument('--game', type=int, help='show a position of this game')
+    parser.add_argument('--move', type=int, default=0, help='position to show (moves played)')
+    parser.add_argument('--verify', action='store_true',
+                        help='re-simulate every game and compare it with the log')
+    args = parser.parse_args()
+
+    if args.record:
+        start = time.perf_counter()
+        record_games(args.log, args.record, args.seed, args.reshuffle)
+        print(f'Recorded {args.record} games in {time.perf_counter() - start:.2f}s')
+
+    with ReplayLog(args.log) as log:
+        start = time.perf_counter()
+        games = len(log)
+        size = len(log.data)
+        print(f'{games} games, {size:,} bytes ({size / max(1, games):.1f} bytes/game), '
+              f'scanned in {time.perf_counter() - start:.3f}s')
+        if args.game is not None:
+            replay = log[args.game]
+            print(f'Game {args.game}: {len(replay)} moves, seed {replay.seed}')
+            print(describe(replay.position(args.move)))
+        if args.verify:
+            start = time.perf_counter()
+            mismatches = verify(log)
+            print(f'Verified {games} games in {time.perf_counter() - start:.2f}s: '
+                  f'{mismatches} mismatches')
+
+
+if __name__ == '__main__':
+    main()
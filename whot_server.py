@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import random
+
+from whot_engine import (
+    BUILTIN_AI, CARD_SHAPE, DECK_SIZE, SHAPE_INDEX, WHOT, GameRandom, WhotGame,
+    iter_cards)
+from whot_tournament import GreedyStrategy, RandomStrategy
+from whot_worker import FixedMove
+
+# Multi-table game server
+#
+# One asyncio process hosts many WhotGame tables. Clients speak
+# line-delimited JSON over TCP or a Unix socket; one connection may sit at
+# any number of tables. Requests:
+#
+#   {"op": "new", "seats": ["human", "random"], "seed": 1, "join": 0}
+#                                             (all but seats optional)
+#   {"op": "join", "table": 3, "seat": 0}     (seat null to watch)
+#   {"op": "play", "table": 3, "card": 17}    (add "shape" for a Whot)
+#   {"op": "pick", "table": 3}
+#   {"op": "leave", "table": 3}
+#
+# Replies are {"type": "table", ...}, {"type": "error", ...} and
+# {"type": "state", "table": 3, ...} carrying only the fields that changed
+# since the connection's last update for that table. Card ids are the
+# engine's (see whot_engine); requested is a shape index or -1.
+#
+# Each table has a single timer (loop.call_later) for whoever is to move:
+# AI seats move after ai_delay, and a human seat that has not moved within
+# turn_timeout has the built-in policy move for it. State is not sent as
+# it changes: tables are marked dirty, and every flush_interval each
+# connection gets one write holding a line per changed table.
+
+HUMAN = 'human'
+AI_STRATEGIES = {'random': RandomStrategy, 'greedy': GreedyStrategy}
+MAX_LINE = 64 * 1024
+MAX_WRITE_BUFFER = 1 << 20  # drop clients that stop reading
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Table:
+    def __init__(self, server, table_id, seats, seed=None, reshuffle_market=False):
+        if not 2 <= len(seats) <= 6:
+            raise ProtocolError('a table has 2 to 6 seats')
+        for kind in seats:
+            if kind != HUMAN and kind not in AI_STRATEGIES:
+                raise ProtocolError(f'unknown seat kind {kind!r}')
+        self.server = server
+        self.id = table_id
+        rng = random.Random() if seed is None else GameRandom(seed)
+        self.game = WhotGame(reshuffle_market, rng=rng, num_players=len(seats))
+        self.kinds = list(seats)
+        self.strategies = [None if kind == HUMAN else AI_STRATEGIES[kind]()
+                           for kind in seats]
+        self.humans = {}  # seat -> connection sitting there
+        self.subscribers = {}  # connection -> seat, or None for watchers
+        self.moves = 0
+        self.timer = None
+        self.schedule()
+
+    def state(self):
+        # Public part of a state update; hands are added per subscriber
+        game = self.game
+        return {
+            'status': game.game_status,
+            'turn': game.turn,
+            'top': game.pile[-1],
+            'requested': -1 if game.requested_shape is None else game.requested_shape,
+            'market': len(game.market),
+            'hands': [len(hand) for hand in game.hands],
+            'winner': -1 if game.winner is None else game.winner,
+            'moves': self.moves,
+        }
+
+    def schedule(self):
+        # (Re)arm the turn timer for the seat that is to move
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.game.game_status != 'playing':
+            return
+        loop = asyncio.get_running_loop()
+        if self.strategies[self.game.turn] is None:
+            self.timer = loop.call_later(self.server.turn_timeout, self.move, BUILTIN_AI)
+        else:
+            self.timer = loop.call_later(self.server.ai_delay, self.move,
+                                         self.strategies[self.game.turn])
+
+    def move(self, strategy):
+        game = self.game
+        game.ai_turn(strategy)
+        self.moves += 1
+        self.server.dirty.add(self)
+        self.schedule()
+
+    def check_turn(self, connection):
+        seat = self.subscribers.get(connection)
+        if seat is None:
+            raise ProtocolError('not seated at this table')
+        if self.game.game_status != 'playing' or self.game.turn != seat:
+            raise ProtocolError('not your turn')
+        return seat
+
+    def play(self, connection, card, shape=None):
+        seat = self.check_turn(connection)
+        if not isinstance(card, int) or not 0 <= card < DECK_SIZE:
+            raise ProtocolError('bad card id')
+        hand = self.game.hands[seat]
+        if card not in hand:
+            raise ProtocolError('card not in hand')
+        if not hand.playable(self.game.playable_mask()) >> card & 1:
+            raise ProtocolError('card must match shape or number')
+        if shape is not None:
+            if CARD_SHAPE[card] != WHOT or SHAPE_INDEX.get(shape, WHOT) == WHOT:
+                raise ProtocolError('bad shape request')
+            shape = SHAPE_INDEX[shape]
+        # A Whot played without a shape requests the most common one left
+        self.move(FixedMove(card, shape))
+
+    def pick(self, connection):
+        self.check_turn(connection)
+        self.move(FixedMove(None))
+
+    def subscribe(self, connection, seat):
+        if seat is not None:
+            if not isinstance(seat, int) or not 0 <= seat < len(self.kinds):
+                raise ProtocolError('bad seat')
+            if self.kinds[seat] != HUMAN:
+                raise ProtocolError('seat is played by the computer')
+            if self.humans.get(seat, connection) is not connection:
+                raise ProtocolError('seat is taken')
+            self.humans[seat] = connection
+        previous = self.subscribers.get(connection)
+        if previous is not None and previous != seat:
+            del self.humans[previous]
+        self.subscribers[connection] = seat
+        connection.tables[self.id] = self
+        connection.last.pop(self.id, None)  # next update is the full state
+        self.server.dirty.add(self)
+
+    def unsubscribe(self, connection):
+        seat = self.subscribers.pop(connection, None)
+        if seat is not None:
+            del self.humans[seat]
+        connection.tables.pop(self.id, None)
+        connection.last.pop(self.id, None)
+        if not self.subscribers:
+            self.close()
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.server.tables.pop(self.id, None)
+        self.server.dirty.discard(self)
+
+
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.tables = {}  # table id -> Table
+        self.last = {}  # table id -> last state sent
+        self.out = []
+
+    def send(self, message):
+        self.out.append(json.dumps(message, separators=(',', ':')))
+
+    def send_state(self, table, state):
+        seat = table.subscribers[self]
+        if seat is not None:
+            state = dict(state)
+            state['hand'] = list(iter_cards(table.game.hands[seat].bits))
+        last = self.last.get(table.id, {})
+        diff = {key: value for key, value in state.items() if last.get(key) != value}
+        if diff:
+            self.last[table.id] = state
+            diff['type'] = 'state'
+            diff['table'] = table.id
+            self.send(diff)
+
+    def flush(self):
+        if not self.out:
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.out.clear()
+            self.writer.close()
+            return
+        self.out.append('')
+        self.writer.write('\n'.join(self.out).encode())
+        self.out.clear()
+
+
+class WhotServer:
+    def __init__(self, ai_delay=1.0, turn_timeout=30.0, flush_interval=0.02):
+        self.ai_delay = ai_delay
+        self.turn_timeout = turn_timeout
+        self.flush_interval = flush_interval
+        self.tables = {}
+        self.next_table = 1
+        self.dirty = set()
+        self.connections = set()
+
+    async def handle(self, reader, writer):
+        connection = Connection(writer)
+        self.connections.add(connection)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break  # reset, or a line over MAX_LINE
+                if not line:
+                    break
+                try:
+                    self.dispatch(connection, json.loads(line))
+                except ProtocolError as error:
+                    connection.send({'type': 'error', 'error': str(error)})
+                except (ValueError, TypeError, AttributeError):
+                    connection.send({'type': 'error', 'error': 'malformed request'})
+        finally:
+            for table in list(connection.tables.values()):
+                table.unsubscribe(connection)
+            self.connections.discard(connection)
+            writer.close()
+
+    def dispatch(self, connection, request):
+        op = request.get('op')
+        if op == 'new':
+            table = Table(self, self.next_table, request.get('seats', [HUMAN, 'random']),
+                          request.get('seed'), bool(request.get('reshuffle', False)))
+            self.next_table += 1
+            self.tables[table.id] = table
+            connection.send({'type': 'table', 'table': table.id, 'seats': table.kinds})
+            # The creator sits at seat "join", or watches if it is missing
+            table.subscribe(connection, request.get('join'))
+            return
+
+        table = self.tables.get(request.get('table'))
+        if table is None:
+            raise ProtocolError('no such table')
+        if op == 'join':
+            table.subscribe(connection, request.get('seat'))
+        elif op == 'leave':
+            table.unsubscribe(connection)
+        elif op == 'play':
+            table.play(connection, request.get('card'), request.get('shape'))
+        elif op == 'pick':
+            table.pick(connection)
+        else:
+            raise ProtocolError(f'unknown op {op!r}')
+
+    def flush(self):
+        # Send every subscriber the changes to its dirty tables, one write
+        # per connection
+        for table in self.dirty:
+            state = table.state()
+            for connection in table.subscribers:
+                connection.send_state(table, state)
+        self.dirty.clear()
+        for connection in self.connections:
+            connection.flush()
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, unix, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        flusher = asyncio.create_task(self.flush_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-table Whot server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead')
+    parser.add_argument('--ai-delay', type=float, default=1.0,
+                        help='seconds a computer seat waits before moving')
+    parser.add_argument('--turn-timeout', type=float, default=30.0,
+                        help='seconds before a human seat is moved for')
+    parser.add_argument('--flush-interval', type=float, default=0.02,
+                        help='seconds between batched state updates')
+    args = parser.parse_args()
+
+    server = WhotServer(args.ai_delay, args.turn_timeout, args.flush_interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
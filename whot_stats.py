@@ -0,0 +1,158 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from whot_batch import NUMBER_OF, TURN_COLUMNS, simulate_batch
+from whot_engine import DECK_SIZE, decode_card
+
+# Columnar game statistics
+#
+# Self-play results are stored as one .npy file per column per chunk:
+#
+#   ROOT/games/<column>.<chunk>.npy   seed, winner, turns, first_card,
+#                                     final_market (one row per game)
+#   ROOT/turns/<column>.<chunk>.npy   TURN_COLUMNS (one row per turn)
+#
+# turns/game holds the global game index, so the two tables join on it.
+# Queries memory-map one chunk at a time and only the columns they use, so
+# they run over stores much larger than RAM.
+
+GAME_COLUMNS = ('seed', 'winner', 'turns', 'first_card', 'final_market')
+TABLES = {'games': GAME_COLUMNS, 'turns': TURN_COLUMNS}
+
+
+def write_chunk(root, chunk, columns):
+    # columns is {(table, name): array}
+    for (table, name), values in columns.items():
+        directory = os.path.join(root, table)
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, f'{name}.{chunk:05d}.npy'), values)
+
+
+def simulate_to_store(root, games, seed=0, chunk_size=100_000):
+    # Play games with the batch simulator and append them to the store
+    store = StatsStore(root)
+    chunk = store.chunks
+    first_game = store.games
+    for start in range(0, games, chunk_size):
+        seeds = np.arange(seed + start, seed + min(games, start + chunk_size), dtype=np.uint64)
+        result = simulate_batch(seeds, record=True)
+        log = result['log']
+
+        # The first turn is always the player's: their opening card, or -1
+        first_card = np.full(len(seeds), -1, dtype=np.int8)
+        opening = log['turn'] == 1
+        first_card[log['game'][opening]] = log['card'][opening]
+
+        columns = {('games', 'seed'): seeds,
+                   ('games', 'winner'): result['winner'],
+                   ('games', 'turns'): result['turns'].astype(np.int16),
+                   ('games', 'first_card'): first_card,
+                   ('games', 'final_market'): result['final_market']}
+        for name in TURN_COLUMNS:
+            columns['turns', name] = log[name]
+        columns['turns', 'game'] = log['game'] + np.int32(first_game + start)
+        write_chunk(root, chunk, columns)
+        chunk += 1
+    return StatsStore(root)
+
+
+class StatsStore:
+    def __init__(self, root):
+        self.root = root
+        self.chunks = len(glob.glob(os.path.join(root, 'games', 'winner.*.npy')))
+
+    def column(self, table, name):
+        # Yield a read-only memory map of the column for every chunk
+        if name not in TABLES[table]:
+            raise KeyError(f'{table} has no column {name!r}')
+        for chunk in range(self.chunks):
+            yield np.load(os.path.join(self.root, table, f'{name}.{chunk:05d}.npy'),
+                          mmap_mode='r')
+
+    def columns(self, table, *names):
+        # Yield a tuple of column maps per chunk
+        return zip(*(self.column(table, name) for name in names))
+
+    @property
+    def games(self):
+        return sum(len(winner) for winner in self.column('games', 'winner'))
+
+    def win_rate_by_first_card(self):
+        # {card id: (player win rate, games)} keyed by the player's opening
+        # card; key -1 is games the player opened by picking
+        wins = np.zeros(DECK_SIZE + 1)
+        games = np.zeros(DECK_SIZE + 1, dtype=np.int64)
+        for first_card, winner in self.columns('games', 'first_card', 'winner'):
+            index = first_card.astype(np.int64) + 1
+            games += np.bincount(index, minlength=DECK_SIZE + 1)
+            wins += np.bincount(index, weights=winner == 0, minlength=DECK_SIZE + 1)
+        return {card - 1: (wins[card] / games[card], int(games[card]))
+                for card in range(DECK_SIZE + 1) if games[card]}
+
+    def penalty_frequency(self):
+        # Share of plays that were a 2 (pick two) or a 14 (general market),
+        # and the share of turns that were picks or passes
+        plays = twos = general_markets = turns = 0
+        for card in self.column('turns', 'card'):
+            played = card[card >= 0]
+            numbers = NUMBER_OF[played]
+            turns += len(card)
+            plays += len(played)
+            twos += np.count_nonzero(numbers == 2)
+            general_markets += np.count_nonzero(numbers == 14)
+        return {'twos': twos / max(1, plays),
+                'general_markets': general_markets / max(1, plays),
+                'picks': (turns - plays) / max(1, turns)}
+
+    def length_by_market(self, bucket=5):
+        # {market size range: (average turns, games)}, grouping games by
+        # how many cards were left in the market when they ended
+        total = np.zeros(0)
+        games = np.zeros(0, dtype=np.int64)
+        for final_market, turns in self.columns('games', 'final_market', 'turns'):
+            index = final_market.astype(np.int64) // bucket
+            size = max(len(total), index.max(initial=0) + 1)
+            total = np.pad(total, (0, size - len(total)))
+            games = np.pad(games, (0, size - len(games)))
+            total += np.bincount(index, weights=turns, minlength=size)
+            games += np.bincount(index, minlength=size)
+        return {(i * bucket, i * bucket + bucket - 1): (total[i] / games[i], int(games[i]))
+                for i in range(len(games)) if games[i]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar Whot self-play statistics')
+    parser.add_argument('root')
+    parser.add_argument('--simulate', type=int, default=0, metavar='GAMES',
+                        help='play GAMES more self-play games into the store')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.simulate:
+        start = time.perf_counter()
+        simulate_to_store(args.root, args.simulate, args.seed)
+        print(f'Stored {args.simulate} games in {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    store = StatsStore(args.root)
+    print(f'{store.games} games in {store.chunks} chunks')
+    print('Player win rate by opening card:')
+    by_card = store.win_rate_by_first_card()
+    for card, (rate, games) in sorted(by_card.items(), key=lambda item: -item[1][0]):
+        name = 'pick' if card < 0 else '{shape} {number}'.format(**decode_card(card))
+        print(f'  {name:<14}{rate:.4f}  ({games} games)')
+    print('Penalty cards:')
+    for key, value in store.penalty_frequency().items():
+        print(f'  {key + ":":<18}{value:.4f}')
+    print('Average turns by cards left in the market:')
+    for (low, high), (turns, games) in store.length_by_market().items():
+        print(f'  {low:>2}-{high:<2}  {turns:7.2f}  ({games} games)')
+    print(f'Queries took {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
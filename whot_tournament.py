@@ -0,0 +1,227 @@
+import argparse
+import math
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from whot_engine import (
+    CARD_NUMBER, CARD_SHAPE, SHAPE_MASKS, WHOT, GameRandom, WhotGame,
+    iter_cards)
+from whot_endgame import EndgameSolver
+from whot_mcts import ISMCTSStrategy
+
+# Self-play tournament
+#
+# Plays AI-vs-AI games across a process pool. Every game owns a GameRandom
+# seeded from (master seed, game index), so a run gives the same results
+# however many workers it is split over.
+
+
+class RandomStrategy:
+    # The computer_play policy: any playable card, most common shape
+
+    def choose_card(self, game, hand):
+        return game.choose_card(hand)
+
+    def choose_shape(self, game, hand):
+        return game.choose_shape(hand)
+
+
+class GreedyStrategy:
+    # Plays penalty cards first, then the card whose shape it holds most
+    # of, and keeps Whot cards for when nothing else fits
+
+    def choose_card(self, game, hand):
+        playable = hand.playable(game.playable_mask())
+        if not playable:
+            return None
+        best = None
+        best_score = None
+        for card in iter_cards(playable):
+            if CARD_SHAPE[card] == WHOT:
+                score = -1
+            elif CARD_NUMBER[card] in (2, 14):
+                score = 100
+            else:
+                score = hand.shape_counts[CARD_SHAPE[card]]
+            if best_score is None or score > best_score:
+                best, best_score = card, score
+        return best
+
+    def choose_shape(self, game, hand):
+        return game.choose_shape(hand)
+
+
+class CountingStrategy(GreedyStrategy):
+    # Greedy play, but a Whot requests the shape that best balances the
+    # cards it holds against how many the next seat is likely to hold,
+    # going by the game's CardTracker
+
+    def choose_shape(self, game, hand):
+        tracker = game.tracker
+        opponent = game.next_seat(game.turn)
+        unseen = tracker.unseen(hand)
+        share = len(game.hands[opponent]) / max(1, unseen.bit_count())
+        void = tracker.voids[opponent] if not tracker.drawn[opponent] else 0
+
+        def score(shape):
+            if not unseen & SHAPE_MASKS[shape] & ~void:
+                return hand.shape_counts[shape]  # the opponent has none
+            return hand.shape_counts[shape] - tracker.unseen_shape_count(hand, shape) * share
+        return max(range(WHOT), key=score)
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'greedy': GreedyStrategy,
+    'counting': CountingStrategy,
+    # Fixed iteration budget, so results do not depend on machine speed
+    'ismcts': partial(ISMCTSStrategy, time_budget=None, max_iterations=300),
+    # Greedy until the endgame solver takes over
+    'endgame': lambda: EndgameSolver(fallback=GreedyStrategy()),
+}
+
+
+def game_seed(master_seed, index):
+    # Independent per-game seed, fixed by the game's index in the run
+    return GameRandom((master_seed << 32) ^ index).next()
+
+
+def play_match(seed, player, computer, max_turns=1000):
+    # Play one game between two strategy objects. Returns a dict with the
+    # winning seat (0 player, 1 computer, -1 stalled or out of turns), the
+    # number of turns and how many 2s, 14s and Whots were played.
+    game = WhotGame(rng=GameRandom(seed))
+    strategies = (player, computer)
+    result = {'winner': -1, 'turns': 0, 'twos': 0, 'general_markets': 0, 'whots': 0}
+
+    while game.game_status != 'ended' and result['turns'] < max_turns:
+        result['turns'] += 1
+        card = game.ai_turn(strategies[game.turn])
+        if card is None:
+            continue
+        if CARD_SHAPE[card] == WHOT:
+            result['whots'] += 1
+        elif CARD_NUMBER[card] == 2:
+            result['twos'] += 1
+        elif CARD_NUMBER[card] == 14:
+            result['general_markets'] += 1
+
+    if game.winner is not None:
+        result['winner'] = game.winner
+    return result
+
+
+def _new_totals(names):
+    totals = {'games': 0, 'stalled': 0, 'turns': 0,
+              'twos': 0, 'general_markets': 0, 'whots': 0}
+    totals['wins'] = {name: 0 for name in names}
+    return totals
+
+
+def _merge(totals, other):
+    for key, value in other.items():
+        if isinstance(value, dict):
+            for name, count in value.items():
+                totals[key][name] += count
+        else:
+            totals[key] += value
+
+
+def play_chunk(args):
+    # Worker: play games [start, stop) of a run and return their totals
+    master_seed, start, stop, kinds = args
+    strategies = [STRATEGIES[kind]() for kind in kinds]
+    names = seat_names(kinds)
+    totals = _new_totals(names)
+    for index in range(start, stop):
+        # Swap seats every other game so neither strategy always moves first
+        seats = (0, 1) if index % 2 == 0 else (1, 0)
+        result = play_match(game_seed(master_seed, index),
+                            strategies[seats[0]], strategies[seats[1]])
+        totals['games'] += 1
+        totals['turns'] += result['turns']
+        for key in ('twos', 'general_markets', 'whots'):
+            totals[key] += result[key]
+        if result['winner'] < 0:
+            totals['stalled'] += 1
+        else:
+            totals['wins'][names[seats[result['winner']]]] += 1
+    return totals
+
+
+def wilson_interval(wins, games, z=1.96):
+    # 95% Wilson score interval for a win rate
+    if games == 0:
+        return 0.0, 0.0
+    p = wins / games
+    denom = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denom
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denom
+    return centre - half, centre + half
+
+
+def format_totals(totals):
+    games = totals['games']
+    lines = [f'{games} games']
+    for name, wins in totals['wins'].items():
+        low, high = wilson_interval(wins, games)
+        lines.append(f'  {name + ":":<26}win rate {wins / max(1, games):.4f} '
+                     f'[{low:.4f}, {high:.4f}]')
+    lines.append(f'  {"stalled:":<26}{totals["stalled"] / max(1, games):.4f}')
+    lines.append(f'  {"avg turns:":<26}{totals["turns"] / max(1, games):.2f}')
+    for key in ('twos', 'general_markets', 'whots'):
+        lines.append(f'  {key + " per game:":<26}{totals[key] / max(1, games):.3f}')
+    return '\n'.join(lines)
+
+
+def seat_names(kinds):
+    # Labels for the two strategies, kept distinct in a mirror match
+    if kinds[0] == kinds[1]:
+        return [kinds[0] + '#1', kinds[1] + '#2']
+    return list(kinds)
+
+
+def run_tournament(kinds, games, master_seed=0, workers=None, chunk_size=1000,
+                   report=None):
+    # Play games across a process pool and return the merged totals.
+    # report(totals) is called as each chunk finishes.
+    kinds = tuple(kinds)
+    chunks = [(master_seed, start, min(start + chunk_size, games), kinds)
+              for start in range(0, games, chunk_size)]
+    totals = _new_totals(seat_names(kinds))
+    with Pool(workers or os.cpu_count()) as pool:
+        for chunk_totals in pool.imap_unordered(play_chunk, chunks):
+            _merge(totals, chunk_totals)
+            if report is not None:
+                report(totals)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whot self-play tournament')
+    parser.add_argument('strategies', nargs=2, choices=sorted(STRATEGIES))
+    parser.add_argument('--games', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    last_report = [0.0]
+
+    def report(totals):
+        now = time.perf_counter()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            print(format_totals(totals), end='\n\n', flush=True)
+
+    start = time.perf_counter()
+    totals = run_tournament(args.strategies, args.games, args.seed, args.workers,
+                            args.chunk_size, report)
+    print(format_totals(totals))
+    print(f'{time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import queue
+import random
+import threading
+
+from whot_engine import CARD_SHAPE, WHOT, WhotGame
+
+# Background AI worker
+#
+# The front end hands the worker a snapshot of the game whenever a computer
+# seat has to move and keeps drawing while the decision is made on a
+# background thread. Each request is a job; poll() returns the decision for
+# the latest job only, so a cancelled or superseded job's late answer is
+# dropped. The decision is one action (a card and Whot shape, or None to
+# pick); the caller replays it on the real game with FixedMove.
+
+
+class FixedMove:
+    # Strategy that replays a decision made elsewhere
+
+    def __init__(self, card, shape=None):
+        self.card = card
+        self.shape = shape
+
+    def choose_card(self, game, hand):
+        return self.card
+
+    def choose_shape(self, game, hand):
+        if self.shape is None:
+            return game.choose_shape(hand)
+        return self.shape
+
+
+class AIWorker:
+    # Runs strategy (or the built-in policy when None) on a daemon thread.
+    # Strategies with a stop_event attribute, and the game's endgame
+    # solver, are given the worker's stop event and should return their
+    # best move so far once it is set.
+
+    def __init__(self, strategy=None):
+        self.strategy = strategy
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()
+        if hasattr(strategy, 'stop_event'):
+            strategy.stop_event = self.stop_event
+        self.job = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, game):
+        # Start thinking about the move for game.turn; returns the job id
+        self.job += 1
+        self.stop_event.clear()
+        seed = game.rng.randrange(1 << 63)
+        self.requests.put((self.job, game.snapshot(), game.tracker.copy(),
+                           game.endgame_solver, seed))
+        return self.job
+
+    def poll(self):
+        # (card, shape) for the current job once it is ready, else None
+        while True:
+            try:
+                job, move = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if job == self.job:
+                return move
+
+    def stop(self):
+        # Ask the strategy to answer now with its best move so far
+        self.stop_event.set()
+
+    def cancel(self):
+        # Forget the current job; its answer will be ignored
+        self.job += 1
+        self.stop_event.set()
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            job, snapshot, tracker, endgame_solver, seed = request
+            if job != self.job:
+                continue
+            game = WhotGame.from_snapshot(snapshot, rng=random.Random(seed),
+                                          computer_strategy=self.strategy)
+            game.tracker = tracker  # snapshots leave out what was learned from picks
+            game.endgame_solver = endgame_solver
+            if endgame_solver is not None:
+                endgame_solver.stop_event = self.stop_event
+            self.results.put((job, self.decide(game)))
+
+    def decide(self, game):
+        # Play the move on a private copy of the game and report it. The
+        # copy keeps the real game's endgame_solver, which takes over from
+        # strategy once it applies.
+        card = game.ai_turn()
+        if card is None or CARD_SHAPE[card] != WHOT:
+            return card, None
+        return card, game.requested_shape